@@ -22,26 +22,19 @@ import sys
 import tempfile
 
 def assign_points(acled_data):
-    with geospatial.geospatial_engine_factory.create_cloud_engine() as geospatial_engine:
-        points = geospatial_engine.create_points(acled_data['latitude'], acled_data['longitude'])
+    with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
         WGS84 = 4326
         WEB_MERCATOR = 3857
-        mercator_points = geospatial_engine.project(points, WGS84, WEB_MERCATOR)
-        x = [mercator_point.x for mercator_point in mercator_points]
-        y = [mercator_point.y for mercator_point in mercator_points]
+        x, y = geospatial_engine.project_coordinates(acled_data['longitude'], acled_data['latitude'], WGS84, WEB_MERCATOR)
         return acled_data.assign(x=x, y=y)
 
-def aggregate_locations(acled_data_spatial, area_data):
+def aggregate_locations(acled_data_spatial, grid_aggregation, area_data):
+    """Uses the point index of the aggregation for selecting the rows of every area."""
     grid_locations = []
     for index, area_row in area_data.iterrows():
-        area_envelope = area_row['SHAPE'].envelope
         grid_location = { 
             'hitCount': area_row['hitCount'], 
-            'locations': acled_data_spatial[(area_envelope.xmin <= acled_data_spatial['x']) \
-                                            & (acled_data_spatial['x'] <= area_envelope.xmax) \
-                                            & (area_envelope.ymin <= acled_data_spatial['y']) \
-                                            & (acled_data_spatial['y'] <= area_envelope.ymax) \
-                                           ]
+            'locations': acled_data_spatial.iloc[grid_aggregation.point_positions(area_row['cellIndex'])]
         }           
         grid_locations.append(grid_location)
     
@@ -94,9 +87,8 @@ def write_excel_report(acled_data, file_name):
 
     spatial_grid = geoint.create_spatial_grid(spacing_meters=5e4)
     acled_spatial = assign_points(acled_data)
-    grid_aggregation = geoint.create_mercator_bins(spatial_grid, acled_spatial['y'], acled_spatial['x'])
-    grid_featureset = grid_aggregation.to_featureset()
-    hot_spots = grid_featureset.sdf.nlargest(3, 'hitCount')[['hitCount', 'SHAPE']]
+    grid_aggregation = geoint.create_mercator_bins(spatial_grid, acled_spatial['y'], acled_spatial['x'], point_index=True)
+    hot_spots = grid_aggregation.to_dataframe(rows_and_columns=False, centers=False).nlargest(3, 'hitCount')
         
     filepath = os.path.join(tempfile.gettempdir(), file_name)
     with pandas.ExcelWriter(filepath) as writer:
@@ -109,7 +101,7 @@ def write_excel_report(acled_data, file_name):
         write_excel_sheet(count_by_subevents(acled_data), writer, sheet_name='event_types')
         write_excel_sheet(count_by_event_date(acled_data), writer, sheet_name='event_dates')
 
-        aggregations = aggregate_locations(acled_spatial, hot_spots)
+        aggregations = aggregate_locations(acled_spatial, grid_aggregation, hot_spots)
         for index in range(0, len(aggregations)):
             aggregation = aggregations[index]
             write_excel_sheet(aggregation['locations'], writer, sheet_name='hot_spots_{}'.format(index + 1))
@@ -0,0 +1,208 @@
+# geoint-py is a simple python module for geospatial intelligence workflows.
+# Copyright (C) 2021 Jan Tschada (gisfromscratch@live.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Offline benchmarks of the hot paths measuring the time and the peak memory at increasing scales.
+The GIS instance is replaced by a stub, so that no network connection is needed.
+
+Run with python benchmark.py --output results.json and compare two runs with python benchmark.py --baseline results.json
+"""
+
+import argparse
+import geoint
+from geoint import geospatial
+from datetime import datetime
+import gc
+import json
+import numpy
+import platform
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+SPACINGS_METERS = [1e7, 1e6, 1e5]
+FULL_SPACINGS_METERS = SPACINGS_METERS + [1e4]
+POINT_COUNTS = [10**3, 10**4, 10**5]
+FULL_POINT_COUNTS = POINT_COUNTS + [10**6, 10**7]
+
+def measure(operation, setup, repeat):
+    """
+    Returns the best time in seconds of several runs and the peak memory in bytes of one traced run.
+    The setup creates the arguments of the operation and is neither timed nor traced.
+    """
+    best_seconds = None
+    for _ in range(repeat):
+        arguments = setup()
+        gc.collect()
+        start = time.perf_counter()
+        operation(*arguments)
+        seconds = time.perf_counter() - start
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+        del arguments
+
+    arguments = setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        operation(*arguments)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return best_seconds, peak_bytes
+
+def create_coordinates(point_count):
+    random_generator = numpy.random.default_rng(25)
+    latitudes = random_generator.uniform(-85.0, 85.0, point_count)
+    longitudes = random_generator.uniform(-180.0, 180.0, point_count)
+    return latitudes, longitudes
+
+def create_web_mercator_grid(geospatial_engine, spacing_meters, lazy):
+    construct_params = geospatial.rectangular_construct_params(geospatial_engine._create_web_mercator_extent(), spacing_meters)
+    return geospatial.rectangular_spatial_grid.build_from_params(construct_params, lazy)
+
+def create_benchmarks(geospatial_engine, spacings, point_counts):
+    """
+    Returns a list of tuples containing the name, the scale, the operation and the setup of every benchmark.
+    """
+    extent = geospatial_engine._create_web_mercator_extent()
+    benchmarks = []
+    for spacing_meters in spacings:
+        scale = '{:.0f} km'.format(spacing_meters / 1e3)
+        benchmarks.append((
+            'rectangular_construct_params.construct_cells', scale,
+            lambda construct_params: construct_params.construct_cells(),
+            lambda spacing_meters=spacing_meters: (geospatial.rectangular_construct_params(extent, spacing_meters),)
+        ))
+        def clear_grid_cache(spacing_meters=spacing_meters):
+            # Every run must create the grid instead of returning the cached one
+            geoint.grid_cache.clear()
+            return (spacing_meters,)
+
+        benchmarks.append((
+            'create_spatial_grid', scale,
+            lambda spacing_meters: geoint.create_spatial_grid(spacing_meters),
+            clear_grid_cache
+        ))
+        benchmarks.append((
+            'cells_as_rings', scale,
+            lambda grid: grid.cells_as_rings(),
+            lambda spacing_meters=spacing_meters: (create_web_mercator_grid(geospatial_engine, spacing_meters, False),)
+        ))
+
+    for point_count in point_counts:
+        scale = '{} points'.format(point_count)
+        def create_points(point_count=point_count):
+            latitudes, longitudes = create_coordinates(point_count)
+            return geospatial_engine.create_points(latitudes, longitudes)
+
+        def create_mercator_points(point_count=point_count):
+            latitudes, longitudes = create_coordinates(point_count)
+            x, y = geospatial_engine.project_coordinates(longitudes, latitudes, geospatial.WGS84, geospatial.WEB_MERCATOR)
+            return [geospatial.Point({ 'x': x_value, 'y': y_value, 'spatialReference': { 'wkid': geospatial.WEB_MERCATOR } }) for (x_value, y_value) in zip(x.tolist(), y.tolist())]
+
+        benchmarks.append((
+            '_project_points_from_wgs84_to_web_mercator', scale,
+            lambda points: geospatial_engine._project_points_from_wgs84_to_web_mercator(points),
+            lambda create_points=create_points: (create_points(),)
+        ))
+        benchmarks.append((
+            '_aggregate_points', scale,
+            lambda grid, points: geospatial_engine._aggregate_points(grid, points, geospatial.WEB_MERCATOR),
+            lambda create_mercator_points=create_mercator_points: (create_web_mercator_grid(geospatial_engine, 1e5, True), create_mercator_points())
+        ))
+        benchmarks.append((
+            'create_bins', scale,
+            lambda grid, latitudes, longitudes: geoint.create_bins(grid, latitudes, longitudes),
+            lambda point_count=point_count: (create_web_mercator_grid(geospatial_engine, 1e5, True),) + create_coordinates(point_count)
+        ))
+        def create_aggregation(point_count=point_count):
+            grid = create_web_mercator_grid(geospatial_engine, 1e5, True)
+            latitudes, longitudes = create_coordinates(point_count)
+            return (geoint.create_bins(grid, latitudes, longitudes),)
+
+        benchmarks.append((
+            'spatial_grid_aggregation.to_featureset', scale,
+            lambda aggregation: aggregation.to_featureset(),
+            create_aggregation
+        ))
+
+    return benchmarks
+
+def run_benchmarks(spacings, point_counts, repeat, name_filter=None):
+    """
+    Runs all benchmarks using a cloud engine whose GIS instance is a stub.
+    """
+    results = []
+    with mock.patch.object(geospatial, 'GIS'):
+        geospatial_engine = geospatial.geospatial_engine_factory.create_cloud_engine().__enter__()
+        geoint.reset_default_engine(geospatial_engine)
+        try:
+            for (name, scale, operation, setup) in create_benchmarks(geospatial_engine, spacings, point_counts):
+                if name_filter and not name_filter in name:
+                    continue
+
+                seconds, peak_bytes = measure(operation, setup, repeat)
+                result = { 'name': name, 'scale': scale, 'seconds': seconds, 'peakBytes': peak_bytes }
+                print('{0:<46} {1:>16} {2:>12.6f} s {3:>10.1f} MiB'.format(name, scale, seconds, peak_bytes / 2**20))
+                results.append(result)
+        finally:
+            geoint.reset_default_engine()
+
+    return results
+
+def compare_results(baseline_results, results):
+    """
+    Prints the ratios of the time and the peak memory against a baseline run, a ratio greater than one is a regression.
+    """
+    baseline = { (result['name'], result['scale']): result for result in baseline_results }
+    print('{0:<46} {1:>16} {2:>12} {3:>12}'.format('benchmark', 'scale', 'time ratio', 'memory ratio'))
+    for result in results:
+        key = (result['name'], result['scale'])
+        if not key in baseline:
+            continue
+
+        baseline_result = baseline[key]
+        time_ratio = result['seconds'] / baseline_result['seconds'] if baseline_result['seconds'] else float('nan')
+        memory_ratio = result['peakBytes'] / baseline_result['peakBytes'] if baseline_result['peakBytes'] else float('nan')
+        print('{0:<46} {1:>16} {2:>12.2f} {3:>12.2f}'.format(result['name'], result['scale'], time_ratio, memory_ratio))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs offline benchmarks of grid construction, binning, projection and featureset export.')
+    parser.add_argument('--full', action='store_true', help='adds 10 km spacing and up to 10^7 points')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs, the best run is reported')
+    parser.add_argument('--filter', default=None, help='runs only the benchmarks whose name contains this text')
+    parser.add_argument('--output', default=None, help='saves the results as JSON file')
+    parser.add_argument('--baseline', default=None, help='compares the results against a saved JSON file')
+    arguments = parser.parse_args()
+
+    spacings = FULL_SPACINGS_METERS if arguments.full else SPACINGS_METERS
+    point_counts = FULL_POINT_COUNTS if arguments.full else POINT_COUNTS
+    results = run_benchmarks(spacings, point_counts, arguments.repeat, arguments.filter)
+    if arguments.output:
+        with open(arguments.output, 'w', encoding='utf-8') as output_file:
+            json.dump({
+                'created': datetime.utcnow().isoformat(),
+                'python': sys.version,
+                'platform': platform.platform(),
+                'numpy': numpy.__version__,
+                'results': results
+            }, output_file, indent=2)
+
+    if arguments.baseline:
+        with open(arguments.baseline, 'r', encoding='utf-8') as baseline_file:
+            compare_results(json.load(baseline_file)['results'], results)
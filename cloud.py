@@ -17,11 +17,382 @@
 
 from arcgis.features import FeatureSet
 from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
 import json
+import numpy
 import os
+import requests
+import tempfile
+import threading
+import time
+import tracemalloc
 import unittest
-from geoint.cloud import protests_aggregate_as_featureset, protests_articles, protests_hotspots_as_featureset
-from geoint.cloud.geoprotests import GeoProtestClient, OutFormat
+from geoint.cloud import close_default_client, default_client, protests_aggregate_as_featureset, protests_articles, protests_hotspots_as_dataframe, protests_hotspots_as_featureset, reset_default_client
+from unittest import mock
+from geoint.cloud.cache import ResponseCache
+from geoint.cloud.columnar import decode_features
+from geoint.cloud import streaming
+from geoint.cloud.streaming import iter_batches, iter_items
+from geoint.cloud.geoprotests import AsyncGeoProtestClient, GeoProtestClient, OutFormat, merge_articles, merge_features
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """
+    Represents a request handler of a local stub server answering every request with one feature or article.
+    The first requests are answered with the failures of the server.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.client_ports.add(self.client_address[1])
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            status = server.failures.pop(0) if server.failures else 200
+
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+
+        body = json.dumps(self._create_response()).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _create_response(self):
+        if self.path.split('?')[0].endswith('/articles'):
+            return [{ 'title': 'Protest', 'url': 'https://localhost/protest' }]
+
+        if 'format=esri' in self.path:
+            return {
+                'geometryType': 'esriGeometryPoint',
+                'spatialReference': { 'wkid': 4326 },
+                'fields': [{ 'name': 'OBJECTID', 'type': 'esriFieldTypeOID', 'alias': 'OBJECTID' }],
+                'features': [{ 'geometry': { 'x': 8.0, 'y': 50.0 }, 'attributes': { 'OBJECTID': 1 } }]
+            }
+
+        return {
+            'type': 'FeatureCollection',
+            'features': [{ 'type': 'Feature', 'geometry': { 'type': 'Point', 'coordinates': [8.0, 50.0] }, 'properties': {} }]
+        }
+
+    def log_message(self, format, *args):
+        pass
+
+class StubServer(object):
+    """
+    Represents a local stub server of the geoprotests API running in a background thread.
+    """
+
+    def __init__(self, failures=None, delay=0.0):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), StubRequestHandler)
+        self._server.lock = threading.Lock()
+        self._server.requests = []
+        self._server.client_ports = set()
+        self._server.failures = list(failures) if failures else []
+        self._server.delay = delay
+        self._server.in_flight = 0
+        self._server.max_in_flight = 0
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self._server.server_address[1])
+
+    def requests(self):
+        return self._server.requests
+
+    def connection_count(self):
+        return len(self._server.client_ports)
+
+    def max_in_flight(self):
+        return self._server.max_in_flight
+
+STUB_AUTH_HEADERS = {
+    'x-rapidapi-host': 'localhost',
+    'x-rapidapi-key': 'stub'
+}
+
+
+
+class TestPooledSession(unittest.TestCase):
+
+    def test_keep_alive(self):
+        with StubServer() as stub_server:
+            with GeoProtestClient(stub_server.url(), STUB_AUTH_HEADERS) as client:
+                for day in range(5):
+                    date = datetime(2022, 5, 1) + timedelta(days=day)
+                    self.assertEqual('FeatureCollection', client.aggregate(date)['type'], 'A feature collection was expected!')
+                    self.assertIsNotNone(client.hotspots(date), 'The returned features must be initialized!')
+
+            self.assertEqual(10, len(stub_server.requests()), 'Every call must send one request!')
+            self.assertEqual(1, stub_server.connection_count(), 'All requests must reuse the same connection!')
+
+    def test_retry_on_server_errors(self):
+        with StubServer([429, 503]) as stub_server:
+            with GeoProtestClient(stub_server.url(), STUB_AUTH_HEADERS, backoff_factor=0.0) as client:
+                geojson_features = client.aggregate(datetime(2022, 5, 1))
+                self.assertEqual('FeatureCollection', geojson_features['type'], 'The client must retry until it succeeds!')
+
+            self.assertEqual(3, len(stub_server.requests()), 'Two retries were expected!')
+
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_past_dates_are_permanent(self):
+        with tempfile.TemporaryDirectory() as directory_path:
+            with StubServer() as stub_server:
+                past_date = datetime(2022, 5, 1)
+                with GeoProtestClient(stub_server.url(), STUB_AUTH_HEADERS, cache=ResponseCache(directory=directory_path)) as client:
+                    self.assertEqual(client.aggregate(past_date), client.aggregate(past_date), 'The cached response must be equal!')
+                    client.aggregate(past_date, OutFormat.ESRI)
+                    client.hotspots(past_date)
+                self.assertEqual(3, len(stub_server.requests()), 'Every endpoint, date and format must be requested once!')
+
+                with GeoProtestClient(stub_server.url(), STUB_AUTH_HEADERS, cache=ResponseCache(directory=directory_path)) as client:
+                    self.assertEqual('FeatureCollection', client.aggregate(past_date)['type'], 'The saved response was expected!')
+                self.assertEqual(3, len(stub_server.requests()), 'The saved response must be reused by another cache!')
+
+    def test_last_24_hours_expire(self):
+        with StubServer() as stub_server:
+            with GeoProtestClient(stub_server.url(), STUB_AUTH_HEADERS, cache=ResponseCache(ttl_seconds=0.0)) as client:
+                client.hotspots()
+                client.hotspots()
+            self.assertEqual(2, len(stub_server.requests()), 'Expired responses must be requested again!')
+
+            with GeoProtestClient(stub_server.url(), STUB_AUTH_HEADERS, cache=ResponseCache(ttl_seconds=60.0)) as client:
+                client.hotspots()
+                client.hotspots()
+            self.assertEqual(3, len(stub_server.requests()), 'Responses within the time to live must be cached!')
+
+    def test_failures_are_not_cached(self):
+        with StubServer([404]) as stub_server:
+            with GeoProtestClient(stub_server.url(), STUB_AUTH_HEADERS, cache=ResponseCache()) as client:
+                client.articles(datetime(2022, 5, 1))
+                client.articles(datetime(2022, 5, 1))
+            self.assertEqual(2, len(stub_server.requests()), 'Failed responses must not be cached!')
+
+
+
+class TestDateRange(unittest.TestCase):
+
+    def test_hotspots_range(self):
+        with StubServer(delay=0.05) as stub_server:
+            with GeoProtestClient(stub_server.url(), STUB_AUTH_HEADERS, pool_size=4) as client:
+                geojson_features = client.hotspots_range(datetime(2022, 5, 1), datetime(2022, 5, 30))
+                esri_features = client.hotspots_range(datetime(2022, 5, 1), datetime(2022, 5, 3), OutFormat.ESRI)
+                articles = client.articles_range(datetime(2022, 5, 1), datetime(2022, 5, 3))
+
+            self.assertEqual(4, stub_server.max_in_flight(), 'The days must be requested concurrently using the pool size!')
+            self.assertEqual(30, len(geojson_features['features']), 'One feature of every day was expected!')
+            self.assertEqual('2022-05-30', geojson_features['features'][-1]['properties']['date'], 'The features must be sorted by date!')
+            self.assertEqual('date', esri_features['fields'][-1]['name'], 'The merged result must have a date field!')
+            spatial_dataframe = FeatureSet.from_dict(esri_features).sdf
+            self.assertEqual(['2022-05-01', '2022-05-02', '2022-05-03'], spatial_dataframe['date'].tolist(), 'Every day was expected!')
+            self.assertEqual(['2022-05-01', '2022-05-02', '2022-05-03'], [article['date'] for article in articles], 'Every day was expected!')
+
+    def test_async_aggregate_range(self):
+        async def fetch_range(url):
+            async with AsyncGeoProtestClient(url, STUB_AUTH_HEADERS) as client:
+                return await client.aggregate_range(datetime(2022, 5, 1), datetime(2022, 5, 7))
+
+        with StubServer() as stub_server:
+            geojson_features = asyncio.run(fetch_range(stub_server.url()))
+            self.assertEqual(7, len(geojson_features['features']), 'One feature of every day was expected!')
+
+    def test_failed_days_are_raised(self):
+        with StubServer([429] * 4) as stub_server:
+            with GeoProtestClient(stub_server.url(), STUB_AUTH_HEADERS, max_retries=3, backoff_factor=0.0) as client:
+                with self.assertRaises(requests.HTTPError):
+                    client.hotspots_range(datetime(2022, 5, 1), datetime(2022, 5, 1))
+            self.assertEqual(4, len(stub_server.requests()), 'The failed day must be retried before it is raised!')
+
+        async def fetch_range(url):
+            async with AsyncGeoProtestClient(url, STUB_AUTH_HEADERS, max_retries=0) as client:
+                return await client.articles_range(datetime(2022, 5, 1), datetime(2022, 5, 3))
+
+        with StubServer([503]) as stub_server:
+            with self.assertRaises(requests.HTTPError):
+                asyncio.run(fetch_range(stub_server.url()))
+
+    def test_merge_rejects_errors(self):
+        dates = [datetime(2022, 5, 1)]
+        with self.assertRaises(ValueError):
+            merge_features(dates, [{ 'error': { 'code': 500, 'message': 'Server error' } }], OutFormat.ESRI)
+        with self.assertRaises(ValueError):
+            merge_articles(dates, [{ 'message': 'Too many requests' }])
+
+
+
+class TestColumnarDecoding(unittest.TestCase):
+
+    def test_decode_points(self):
+        with StubServer() as stub_server:
+            with GeoProtestClient(stub_server.url(), STUB_AUTH_HEADERS) as client:
+                geojson_columns = decode_features(client.hotspots_range(datetime(2022, 5, 1), datetime(2022, 5, 3)))
+                esri_columns = decode_features(client.hotspots(datetime(2022, 5, 1), OutFormat.ESRI))
+
+        self.assertFalse(geojson_columns.is_polygon(), 'Points were expected!')
+        dataframe = geojson_columns.to_dataframe()
+        self.assertEqual(['date', 'x', 'y'], dataframe.columns.tolist(), 'The attributes and coordinates were expected!')
+        self.assertEqual([8.0, 8.0, 8.0], dataframe['x'].tolist(), 'The x coordinates were expected!')
+        self.assertEqual([1], esri_columns.attributes()['OBJECTID'].tolist(), 'The esri attributes were expected!')
+        self.assertEqual([50.0], esri_columns.y().tolist(), 'The y coordinates were expected!')
+
+    def test_decode_polygons(self):
+        square = [[0.0, 0.0], [2.0, 0.0], [2.0, 2.0], [0.0, 2.0], [0.0, 0.0]]
+        hole = [[0.5, 0.5], [0.5, 1.5], [1.5, 1.5], [0.5, 0.5]]
+        geojson_features = {
+            'type': 'FeatureCollection',
+            'features': [
+                { 'type': 'Feature', 'geometry': { 'type': 'Polygon', 'coordinates': [square, hole] }, 'properties': { 'count': 3 } },
+                { 'type': 'Feature', 'geometry': None, 'properties': { 'count': 0 } },
+                { 'type': 'Feature', 'geometry': { 'type': 'MultiPolygon', 'coordinates': [[square], [square]] }, 'properties': { 'count': 5 } }
+            ]
+        }
+        columns = decode_features(geojson_features)
+        self.assertTrue(columns.is_polygon(), 'Polygons were expected!')
+        self.assertEqual([0, 2, 2, 4], columns.feature_offsets().tolist(), 'Every feature must own its rings!')
+        self.assertEqual([0, 5, 9, 14, 19], columns.ring_offsets().tolist(), 'Every ring must own its vertices!')
+        self.assertEqual(4, len(columns.rings(0)[1]), 'The hole must have four vertices!')
+        dataframe = columns.to_dataframe()
+        self.assertEqual([1.0, 1.0], dataframe['centerX'].iloc[[0, 2]].tolist(), 'The centers of the outer rings were expected!')
+        self.assertTrue(numpy.isnan(dataframe['centerX'].iloc[1]), 'A missing geometry must not have a center!')
+        self.assertEqual([3, 0, 5], dataframe['count'].tolist(), 'The attributes were expected!')
+
+    def test_decode_sparse_properties(self):
+        geojson_features = {
+            'type': 'FeatureCollection',
+            'features': [
+                { 'type': 'Feature', 'geometry': { 'type': 'Point', 'coordinates': [1.0, 2.0] }, 'properties': { 'count': 1 } },
+                { 'type': 'Feature', 'geometry': { 'type': 'Point', 'coordinates': [3.0, 4.0] }, 'properties': { 'name': 'Protest' } },
+                { 'type': 'Feature', 'geometry': { 'type': 'Point', 'coordinates': [5.0, 6.0] }, 'properties': None }
+            ]
+        }
+        attributes = decode_features(geojson_features).attributes()
+        self.assertEqual(['count', 'name'], list(attributes.keys()), 'The attribute names must keep their first appearance!')
+        self.assertEqual([1, None, None], attributes['count'].tolist(), 'Missing properties must be None!')
+        self.assertEqual([None, 'Protest', None], attributes['name'].tolist(), 'Earlier features must be backfilled with None!')
+
+
+
+class TestStreaming(unittest.TestCase):
+
+    def test_split_chunks(self):
+        payload = {
+            'type': 'FeatureCollection',
+            'crs': { 'type': 'name', 'properties': { 'name': 'EPSG:4326' } },
+            'features': [{ 'type': 'Feature', 'geometry': { 'type': 'Point', 'coordinates': [8.123456789, -50.5] }, 'properties': { 'name': 'Zürich', 'count': index * 1000003 } } for index in range(20)],
+            'exceededTransferLimit': False
+        }
+        payload_bytes = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        for chunk_size in (1, 3, 7, 64, len(payload_bytes)):
+            chunks = [payload_bytes[start:start + chunk_size] for start in range(0, len(payload_bytes), chunk_size)]
+            self.assertEqual(payload['features'], list(iter_items(chunks)), 'Every feature must be decoded!')
+
+        articles = [{ 'title': 'Protest {}'.format(index) } for index in range(5)]
+        batches = list(iter_batches(iter_items([json.dumps(articles).encode('utf-8')]), 2))
+        self.assertEqual([2, 2, 1], [len(batch) for batch in batches], 'Batches of two articles were expected!')
+
+    def test_bounded_memory(self):
+        feature = json.dumps({ 'type': 'Feature', 'geometry': { 'type': 'Point', 'coordinates': [8.0, 50.0] }, 'properties': { 'title': 'x' * 100 } }).encode('utf-8')
+        def create_chunks():
+            yield b'{"type": "FeatureCollection", "features": ['
+            for index in range(50000):
+                yield feature if 0 == index else b',' + feature
+            yield b']}'
+
+        tracemalloc.start()
+        try:
+            feature_count = sum(1 for _ in iter_items(create_chunks()))
+            _, peak_size = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(50000, feature_count, 'Every feature must be decoded!')
+        self.assertLess(peak_size, 1024 * 1024, 'The memory must not grow with the payload of about 8 MB!')
+
+    def test_large_items(self):
+        rings = [[[float(index), float(-index)] for index in range(100000)]]
+        feature = { 'type': 'Feature', 'geometry': { 'type': 'Polygon', 'coordinates': rings }, 'properties': {} }
+        payload_bytes = json.dumps({ 'type': 'FeatureCollection', 'features': [feature, feature] }).encode('utf-8')
+        chunks = [payload_bytes[start:start + 4096] for start in range(0, len(payload_bytes), 4096)]
+        with mock.patch.object(streaming, 'JSON_DECODER', wraps=streaming.JSON_DECODER) as decoder:
+            self.assertEqual([feature, feature], list(iter_items(chunks)), 'Every feature must be decoded!')
+        self.assertLess(decoder.raw_decode.call_count, 50, 'A large item must not be decoded again for every chunk!')
+
+    def test_iter_hotspots(self):
+        with StubServer() as stub_server:
+            with GeoProtestClient(stub_server.url(), STUB_AUTH_HEADERS) as client:
+                features = list(client.iter_hotspots(datetime(2022, 5, 1), chunk_size=16))
+                articles = list(client.iter_articles(datetime(2022, 5, 1), batch_size=10))
+
+        self.assertEqual([[8.0, 50.0]], [feature['geometry']['coordinates'] for feature in features], 'The streamed feature was expected!')
+        self.assertEqual([['Protest']], [[article['title'] for article in batch] for batch in articles], 'One batch of articles was expected!')
+
+
+
+class TestDefaultClient(unittest.TestCase):
+
+    def tearDown(self):
+        close_default_client()
+
+    def test_shared_client(self):
+        with StubServer() as stub_server:
+            environment = {
+                'x_rapidapi_url': stub_server.url(),
+                'x_rapidapi_host': 'localhost',
+                'x_rapidapi_key': 'stub'
+            }
+            with mock.patch.dict(os.environ, environment):
+                reset_default_client()
+                shared_clients = []
+                threads = [threading.Thread(target=lambda: shared_clients.append(default_client())) for _ in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertEqual(1, len(set(map(id, shared_clients))), 'All threads must share one client!')
+
+                for day in range(3):
+                    dataframe = protests_hotspots_as_dataframe(datetime(2022, 5, 1) + timedelta(days=day))
+                    self.assertEqual(1, len(dataframe), 'One hotspot was expected!')
+
+                shared_client = default_client()
+                reset_default_client()
+                self.assertIsNot(shared_client, default_client(), 'A reset client must not be shared anymore!')
+
+            self.assertEqual(1, stub_server.connection_count(), 'The module-level functions must reuse the pooled connection!')
+
+
+
+class TestAsyncClient(unittest.TestCase):
+
+    def test_bounded_fan_out(self):
+        async def fan_out(url):
+            async with AsyncGeoProtestClient(url, STUB_AUTH_HEADERS, max_concurrency=2) as client:
+                dates = [datetime(2022, 5, 1) + timedelta(days=day) for day in range(6)]
+                return await client.gather(client.aggregate, dates, OutFormat.GEOJSON)
+
+        with StubServer(delay=0.05) as stub_server:
+            results = asyncio.run(fan_out(stub_server.url()))
+            self.assertEqual(6, len(results), 'One result for every date was expected!')
+            self.assertTrue(all('FeatureCollection' == result['type'] for result in results), 'Feature collections were expected!')
+            self.assertEqual(6, len(stub_server.requests()), 'Every date must send one request!')
+            self.assertEqual(2, stub_server.max_in_flight(), 'Not more than two requests must be sent at the same time!')
+
+
 
 class TestGeoProtestClient(unittest.TestCase):
 
@@ -15,40 +15,179 @@
 #
 
 from . import geospatial
+import atexit
+import threading
+# The grids being created by the module-level functions are cached, eager grids only as long as they are referenced.
+# The grids being created by the module-level functions are cached.
+# Replace it by a cache using a directory, so that other processes can reuse the grids.
+grid_cache = geospatial.spatial_grid_cache()
 
-def create_spatial_grid(spacing_meters):
+WORLD_EXTENT = (-180.0, -90.0, 180.0, 90.0)
+
+# The module-level functions share one local engine, grid creation and binning do not need any network connection.
+_default_engine = None
+_default_engine_lock = threading.Lock()
+
+# Only projections into spatial references other than WGS84 and Web Mercator share one cloud engine.
+_cloud_engine = None
+_cloud_engine_lock = threading.Lock()
+
+def default_engine():
+    """
+    Returns the shared geospatial engine being used by the module-level functions.
+    The local engine is created on the first call and reused by all threads until the engine is reset.
+    """
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            _default_engine = geospatial.geospatial_engine_factory.create_local_engine().__enter__()
+        return _default_engine
+
+def reset_default_engine(engine=None):
+    """
+    Closes the shared geospatial engine, so that the next call creates a new one.
+    When an engine is specified, it must already be entered and is shared instead.
+    """
+    global _default_engine
+    with _default_engine_lock:
+        previous_engine, _default_engine = _default_engine, engine
+    if previous_engine is not None and previous_engine is not engine:
+        previous_engine.__exit__(None, None, None)
+
+def close_default_engine():
+    """
+    Closes the shared geospatial engine.
+    """
+    reset_default_engine()
+
+atexit.register(close_default_engine)
+
+def default_cloud_engine():
+    """
+    Returns the shared cloud engine being used for projecting into spatial references other than WGS84 and Web Mercator.
+    When the shared geospatial engine is a cloud engine, it is returned instead.
+    The cloud engine is created on the first call and reused by all threads until the engine is reset, its GIS instance is created on the first projection.
+    """
+    global _cloud_engine
+    geospatial_engine = default_engine()
+    if isinstance(geospatial_engine, geospatial.ago_geospatial_engine):
+        return geospatial_engine
+
+    with _cloud_engine_lock:
+        if _cloud_engine is None:
+            _cloud_engine = geospatial.geospatial_engine_factory.create_cloud_engine().__enter__()
+        return _cloud_engine
+
+def reset_default_cloud_engine(engine=None):
+    """
+    Closes the shared cloud engine, so that the next call creates a new one.
+    When an engine is specified, it must already be entered and is shared instead.
+    """
+    global _cloud_engine
+    with _cloud_engine_lock:
+        previous_engine, _cloud_engine = _cloud_engine, engine
+    if previous_engine is not None and previous_engine is not engine:
+        previous_engine.__exit__(None, None, None)
+
+def close_default_cloud_engine():
+    """
+    Closes the shared cloud engine.
+    """
+    reset_default_cloud_engine()
+
+atexit.register(close_default_cloud_engine)
+
+def create_spatial_grid(spacing_meters, lazy=False):
     """
     Creates a new spatial grid using Web Mercator as spatial reference.
+    A lazy grid does not hold any cells in memory, the cells are constructed on demand.
+    Grids having the same spacing are returned from the grid cache.
     """
-    with geospatial.geospatial_engine_factory.create_cloud_engine() as geospatial_engine:
-        return geospatial_engine.create_spatial_grid(spacing_meters)
+    def create_grid():
+        return default_engine().create_spatial_grid(spacing_meters, lazy)
 
+    return grid_cache.get_or_create('rectangular', spacing_meters, WORLD_EXTENT, 3857, lazy, create_grid)
 
 
-def create_bins(spatial_grid, latitudes, longitudes):
+
+def create_hexagonal_spatial_grid(spacing_meters, lazy=False):
+    """
+    Creates a new hexagonal spatial grid using Web Mercator as spatial reference.
+    The spacing is the distance between the center and the vertices of every hexagon.
+    A lazy grid does not hold any cells in memory, the cells are constructed on demand.
+    Grids having the same spacing are returned from the grid cache.
+    """
+    def create_grid():
+        return default_engine().create_hexagonal_spatial_grid(spacing_meters, lazy)
+
+    return grid_cache.get_or_create('hexagonal', spacing_meters, WORLD_EXTENT, 3857, lazy, create_grid)
+
+
+
+def _project_wgs84_coordinates(longitudes, latitudes, wkid):
+    """
+    Projects WGS84 coordinates into the spatial reference of a grid.
+    Only spatial references other than WGS84 and Web Mercator are projected using the project service of the shared cloud engine.
+    """
+    WGS84 = 4326
+    WEB_MERCATOR = 3857
+    if (geospatial.as_wkid(wkid) in (WGS84, WEB_MERCATOR)):
+        return default_engine().project_coordinates(longitudes, latitudes, WGS84, wkid)
+
+    return default_cloud_engine().project_coordinates(longitudes, latitudes, WGS84, wkid)
+
+
+
+def create_bins(spatial_grid, latitudes, longitudes, workers=None, chunk_size=None, point_index=False, values=None, statistics=None):
     """
     Creates bins using a spatial grid and WGS84 coordinates.
+    The coordinates are binned locally, only grids not using WGS84 or Web Mercator need the project service.
+    The coordinates can be lists, numpy arrays or pandas series.
+    More than one worker bins the coordinates in chunks using a process pool.
+    The point index maps every bin to the positions of its coordinates.
+    The point index and the values are binned by a single process, so they cannot be combined with more than one worker.
+    The statistics like 'sum', 'mean', 'min', 'max' and 'count_distinct' are computed for every value column.
     """
-    with geospatial.geospatial_engine_factory.create_cloud_engine() as geospatial_engine:
-        points = geospatial_engine.create_points(latitudes, longitudes)
-        WGS84 = 4326
-        if (WGS84 != spatial_grid.wkid()):
-            # We need to reproject the points
-            points = geospatial_engine.project(points, WGS84, spatial_grid.wkid())
-        
-        return geospatial_engine.aggregate(spatial_grid, points, spatial_grid.wkid())
+    x = longitudes
+    y = latitudes
+    WGS84 = 4326
+    if (WGS84 != spatial_grid.wkid()):
+        # We need to reproject the coordinates
+        x, y = _project_wgs84_coordinates(longitudes, latitudes, spatial_grid.wkid())
+    
+    return default_engine().aggregate_coordinates(spatial_grid, x, y, spatial_grid.wkid(), workers, chunk_size, point_index, values, statistics)
 
 
 
-def create_mercator_bins(spatial_grid, y, x):
+def create_mercator_bins(spatial_grid, y, x, workers=None, chunk_size=None, point_index=False, values=None, statistics=None):
     """
     Creates bins using a spatial grid and Web Mercator coordinates.
+    The coordinates can be lists, numpy arrays or pandas series.
+    More than one worker bins the coordinates in chunks using a process pool.
+    The point index maps every bin to the positions of its coordinates.
+    The point index and the values are binned by a single process, so they cannot be combined with more than one worker.
+    The statistics like 'sum', 'mean', 'min', 'max' and 'count_distinct' are computed for every value column.
+    """
+    WEB_MERCATOR = 3857
+    if (WEB_MERCATOR != spatial_grid.wkid()):
+        # We need to reproject the points
+        raise ValueError('A spatial grid with a web mercator spatial reference was expected!')
+    
+    return default_engine().aggregate_coordinates(spatial_grid, x, y, spatial_grid.wkid(), workers, chunk_size, point_index, values, statistics)
+
+
+
+def create_space_time_bins(spatial_grid, latitudes, longitudes, timestamps, bucket_size):
+    """
+    Creates a space time cube using a spatial grid, WGS84 coordinates and timestamps.
+    The bucket size is a timedelta like one day or one week, weekly buckets start on mondays.
+    Every time step of the cube can be sliced as a spatial grid aggregation.
     """
-    with geospatial.geospatial_engine_factory.create_cloud_engine() as geospatial_engine:
-        points = geospatial_engine.create_points(y, x)
-        WEB_MERCATOR = 3857
-        if (WEB_MERCATOR != spatial_grid.wkid()):
-            # We need to reproject the points
-            raise ValueError('A spatial grid with a web mercator spatial reference was expected!')
-        
-        return geospatial_engine.aggregate(spatial_grid, points, spatial_grid.wkid())
\ No newline at end of file
+    x = longitudes
+    y = latitudes
+    WGS84 = 4326
+    if (WGS84 != spatial_grid.wkid()):
+        # We need to reproject the coordinates
+        x, y = _project_wgs84_coordinates(longitudes, latitudes, spatial_grid.wkid())
+    
+    return default_engine().aggregate_space_time(spatial_grid, x, y, timestamps, spatial_grid.wkid(), bucket_size)
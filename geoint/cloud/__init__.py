@@ -16,8 +16,10 @@
 # 
 
 import arcgis
+import atexit
 import os
-from . import geoprotests
+import threading
+from . import columnar, geoprotests
 
 
 
@@ -52,13 +54,49 @@ class EnvironmentClientFactory(object):
 
 
 
+# The module-level functions share one client and its pooled session.
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def default_client():
+    """
+    Returns the shared client being used by the module-level functions.
+    The client is created using the environment on the first call and reused by all threads until the client is reset.
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = EnvironmentClientFactory.create_geoprotest_client()
+        return _default_client
+
+def reset_default_client(client=None):
+    """
+    Closes the shared client, so that the next call creates a new one using the environment.
+    When a client is specified, it is shared instead, e.g. a client using a response cache.
+    """
+    global _default_client
+    with _default_client_lock:
+        previous_client, _default_client = _default_client, client
+    if previous_client is not None and previous_client is not client:
+        previous_client.close()
+
+def close_default_client():
+    """
+    Closes the shared client and its pooled session.
+    """
+    reset_default_client()
+
+atexit.register(close_default_client)
+
+
+
 def protests_aggregate_as_geojson(date=None):
     """
     Aggregates the broadcasted news related to protests/demonstrations using a spatial grid and returns the features as hexagonal bins using the GeoJSON format.
     The date is optional. When not specified, we return the features of the last 24 hours.
     The underlying hosted feature service saves the last 90 days and yesterday should be the latest available date.
     """
-    client = EnvironmentClientFactory.create_geoprotest_client()
+    client = default_client()
     return client.aggregate(date, geoprotests.OutFormat.GEOJSON)
 
 def protests_aggregate_as_featureset(date=None):
@@ -67,16 +105,25 @@ def protests_aggregate_as_featureset(date=None):
     The date is optional. When not specified, we return the features of the last 24 hours.
     The underlying hosted feature service saves the last 90 days and yesterday should be the latest available date.
     """
-    client = EnvironmentClientFactory.create_geoprotest_client()
+    client = default_client()
     return arcgis.features.FeatureSet.from_json(client.aggregate_as_text(date, geoprotests.OutFormat.ESRI))
 
+def protests_aggregate_as_dataframe(date=None):
+    """
+    Aggregates the broadcasted news related to protests/demonstrations using a spatial grid and returns a pandas DataFrame.
+    The GeoJSON response is decoded into columns directly having 'centerX' and 'centerY' columns for the hexagonal bins.
+    The date is optional. When not specified, we return the features of the last 24 hours.
+    """
+    client = default_client()
+    return columnar.decode_features(client.aggregate(date, geoprotests.OutFormat.GEOJSON)).to_dataframe()
+
 def protests_articles(date=None):
     """
     Returns a list of broadcasted articles related to protests/demonstrations.
     The date is optional. When not specified, we return the articles of the last 24 hours.
     The underlying web service saves the last 90 days and yesterday should be the latest available date.
     """
-    client = EnvironmentClientFactory.create_geoprotest_client()
+    client = default_client()
     return client.articles(date)
 
 def protests_hotspots_as_geojson(date=None):
@@ -85,14 +132,51 @@ def protests_hotspots_as_geojson(date=None):
     The date is optional. When not specified, we return the features of the last 24 hours.
     The underlying hosted feature service saves the last 90 days and yesterday should be the latest availabe date.
     """
-    client = EnvironmentClientFactory.create_geoprotest_client()
+    client = default_client()
     return client.hotspots(date, geoprotests.OutFormat.GEOJSON)
 
+def protests_hotspots_as_dataframe(date=None):
+    """
+    Returns the hotspot locations related to protests/demonstrations as a pandas DataFrame.
+    The GeoJSON response is decoded into columns directly having 'x' and 'y' columns for the locations.
+    The date is optional. When not specified, we return the features of the last 24 hours.
+    """
+    client = default_client()
+    return columnar.decode_features(client.hotspots(date, geoprotests.OutFormat.GEOJSON)).to_dataframe()
+
 def protests_hotspots_as_featureset(date=None):
     """
     Returns the hotspot locations related to protests/demonstrations as a Esri FeatureSet.
     The date is optional. When not specified, we return the features of the last 24 hours.
     The underlying hosted feature service saves the last 90 days and yesterday should be the latest availabe date.
     """
-    client = EnvironmentClientFactory.create_geoprotest_client()
-    return arcgis.features.FeatureSet.from_json(client.hotspots_as_text(date, geoprotests.OutFormat.ESRI))
\ No newline at end of file
+    client = default_client()
+    return arcgis.features.FeatureSet.from_json(client.hotspots_as_text(date, geoprotests.OutFormat.ESRI))
+
+def protests_aggregate_range_as_featureset(start, end):
+    """
+    Aggregates the broadcasted news related to protests/demonstrations of all days between the start and the end date.
+    Returns one Esri FeatureSet containing the hexagonal bins of every day having a 'date' field.
+    The days are requested concurrently using one client.
+    """
+    client = default_client()
+    return arcgis.features.FeatureSet.from_dict(client.aggregate_range(start, end, geoprotests.OutFormat.ESRI))
+
+def protests_articles_range_as_dataframe(start, end):
+    """
+    Returns the broadcasted articles related to protests/demonstrations of all days between the start and the end date.
+    Returns one pandas DataFrame having a 'date' column.
+    The days are requested concurrently using one client.
+    """
+    import pandas as pd
+    client = default_client()
+    return pd.DataFrame(client.articles_range(start, end))
+
+def protests_hotspots_range_as_featureset(start, end):
+    """
+    Returns the hotspot locations related to protests/demonstrations of all days between the start and the end date.
+    Returns one Esri FeatureSet containing the hotspots of every day having a 'date' field.
+    The days are requested concurrently using one client.
+    """
+    client = default_client()
+    return arcgis.features.FeatureSet.from_dict(client.hotspots_range(start, end, geoprotests.OutFormat.ESRI))
@@ -0,0 +1,110 @@
+# geoint-py is a simple python module for geospatial intelligence workflows.
+# Copyright (C) 2022 Jan Tschada (gisfromscratch@live.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from collections import OrderedDict
+import gzip
+import hashlib
+import os
+import threading
+import time
+
+
+
+class ResponseCache(object):
+    """
+    Represents a thread-safe cache of response texts keyed by endpoint, date and format.
+    The least recently used responses are evicted from memory when the maximum size is exceeded.
+    Permanent responses never expire and are also saved as compressed files when a directory is specified.
+    All other responses expire after the time to live.
+    """
+
+    def __init__(self, max_size=128, directory=None, ttl_seconds=300.0) -> None:
+        """
+        Initializes this instance using the maximum number of responses in memory, an optional directory and the time to live in seconds.
+        """
+        if (max_size < 1):
+            raise ValueError('The maximum size must be greater than zero!')
+        if (ttl_seconds < 0):
+            raise ValueError('The time to live must not be negative!')
+
+        self._max_size = max_size
+        self._directory = directory
+        self._ttl_seconds = ttl_seconds
+        self._responses = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._responses)
+
+    def get(self, key):
+        """
+        Returns the cached response text or None when the key is unknown or the response is expired.
+        """
+        with self._lock:
+            if key in self._responses:
+                text, expires_at = self._responses[key]
+                if (expires_at is None or time.monotonic() < expires_at):
+                    self._responses.move_to_end(key)
+                    return text
+
+                del self._responses[key]
+                return None
+
+        file_path = self._file_path(key)
+        if not file_path or not os.path.exists(file_path):
+            return None
+
+        with gzip.open(file_path, 'rt', encoding='utf-8') as response_file:
+            text = response_file.read()
+        self._add(key, text, None)
+        return text
+
+    def put(self, key, text, permanent):
+        """
+        Adds the response text, a permanent response is also saved into the directory.
+        """
+        expires_at = None if permanent else time.monotonic() + self._ttl_seconds
+        self._add(key, text, expires_at)
+        file_path = self._file_path(key) if permanent else None
+        if file_path:
+            temp_file_path = '{0}.{1}.tmp'.format(file_path, threading.get_ident())
+            with gzip.open(temp_file_path, 'wt', encoding='utf-8') as response_file:
+                response_file.write(text)
+            os.replace(temp_file_path, file_path)
+
+    def _add(self, key, text, expires_at):
+        with self._lock:
+            self._responses[key] = (text, expires_at)
+            self._responses.move_to_end(key)
+            while (self._max_size < len(self._responses)):
+                self._responses.popitem(last=False)
+
+    def _file_path(self, key):
+        if not self._directory:
+            return None
+
+        key_hash = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self._directory, '{}.json.gz'.format(key_hash))
+
+    def clear(self):
+        """
+        Removes all responses from memory, the saved responses are kept.
+        """
+        with self._lock:
+            self._responses.clear()
@@ -0,0 +1,187 @@
+# geoint-py is a simple python module for geospatial intelligence workflows.
+# Copyright (C) 2022 Jan Tschada (gisfromscratch@live.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import numpy as np
+
+
+
+class FeatureColumns(object):
+    """
+    Represents the features of a GeoJSON or Esri JSON response as parallel columns.
+    Points are stored as x and y arrays, polygons as one coordinate array with CSR-style offsets.
+    The ring offsets mark the start of every ring in the coordinates, the feature offsets mark the first ring of every feature.
+    """
+
+    def __init__(self, attributes, x=None, y=None, coordinates=None, ring_offsets=None, feature_offsets=None) -> None:
+        self._attributes = attributes
+        self._x = x
+        self._y = y
+        self._coordinates = coordinates
+        self._ring_offsets = ring_offsets
+        self._feature_offsets = feature_offsets
+
+    def __len__(self):
+        if self._x is not None:
+            return len(self._x)
+        if self._feature_offsets is not None:
+            return len(self._feature_offsets) - 1
+        return len(next(iter(self._attributes.values()))) if self._attributes else 0
+
+    def attributes(self):
+        """
+        Returns a dictionary mapping the attribute names to numpy arrays.
+        """
+        return self._attributes
+
+    def is_polygon(self):
+        return self._coordinates is not None
+
+    def x(self):
+        return self._x
+
+    def y(self):
+        return self._y
+
+    def coordinates(self):
+        """
+        Returns the vertices of all rings as an array having one x and y row for every vertex.
+        """
+        return self._coordinates
+
+    def ring_offsets(self):
+        """
+        Returns the offsets of every ring into the coordinates having one entry more than rings.
+        """
+        return self._ring_offsets
+
+    def feature_offsets(self):
+        """
+        Returns the offsets of every feature into the rings having one entry more than features.
+        """
+        return self._feature_offsets
+
+    def rings(self, feature_index):
+        """
+        Returns the rings of the specified feature as a list of coordinate arrays.
+        """
+        ring_start, ring_stop = self._feature_offsets[feature_index], self._feature_offsets[feature_index + 1]
+        return [self._coordinates[self._ring_offsets[ring_index]:self._ring_offsets[ring_index + 1]] for ring_index in range(ring_start, ring_stop)]
+
+    def centers(self):
+        """
+        Returns the x and y arrays of the mean vertex of the first ring of every polygon.
+        The closing vertex is ignored and features without rings have NaN coordinates.
+        """
+        feature_count = len(self._feature_offsets) - 1
+        center_x = np.full(feature_count, np.nan)
+        center_y = np.full(feature_count, np.nan)
+        has_rings = self._feature_offsets[1:] > self._feature_offsets[:-1]
+        first_rings = self._feature_offsets[:-1][has_rings]
+        ring_starts = self._ring_offsets[first_rings]
+        ring_lengths = self._ring_offsets[first_rings + 1] - ring_starts - 1
+        if (0 < len(first_rings)):
+            vertex_owners = np.repeat(np.arange(len(first_rings)), ring_lengths)
+            vertex_positions = np.arange(ring_lengths.sum()) - np.repeat(np.cumsum(ring_lengths) - ring_lengths, ring_lengths) + np.repeat(ring_starts, ring_lengths)
+            vertices = self._coordinates[vertex_positions]
+            center_x[has_rings] = np.bincount(vertex_owners, weights=vertices[:, 0], minlength=len(first_rings)) / ring_lengths
+            center_y[has_rings] = np.bincount(vertex_owners, weights=vertices[:, 1], minlength=len(first_rings)) / ring_lengths
+        return center_x, center_y
+
+    def to_dataframe(self):
+        """
+        Returns the attributes as pandas dataframe having 'x' and 'y' columns for points or 'centerX' and 'centerY' columns for polygons.
+        """
+        import pandas as pd
+        columns = dict(self._attributes)
+        if self._x is not None:
+            columns['x'] = self._x
+            columns['y'] = self._y
+        elif self._coordinates is not None:
+            columns['centerX'], columns['centerY'] = self.centers()
+
+        return pd.DataFrame(columns, copy=False)
+
+
+
+def decode_features(response):
+    """
+    Decodes the features of a GeoJSON or Esri JSON response into parallel columns using one pass over the features.
+    Supports point and polygon geometries, multi polygons are stored as rings of the same feature.
+    """
+    features = response.get('features', [])
+    esri = 'geometryType' in response or 'fields' in response or (features and 'attributes' in features[0])
+    properties_key = 'attributes' if esri else 'properties'
+    # The attribute names are collected while decoding unless the Esri fields define them
+    fixed_names = esri and 'fields' in response
+    attribute_values = { field['name']: [] for field in response['fields'] } if fixed_names else {}
+    x = []
+    y = []
+    coordinates = []
+    ring_offsets = [0]
+    feature_offsets = [0]
+    polygon = False
+    for (feature_index, feature) in enumerate(features):
+        properties = feature.get(properties_key) or {}
+        if not fixed_names:
+            for name in properties:
+                if not name in attribute_values:
+                    # The earlier features do not have this attribute
+                    attribute_values[name] = [None] * feature_index
+
+        for (name, values) in attribute_values.items():
+            values.append(properties.get(name))
+
+        geometry = feature.get('geometry')
+        rings = None
+        point = None
+        if not geometry:
+            pass
+        elif esri:
+            if 'rings' in geometry:
+                rings = geometry['rings']
+            else:
+                point = (geometry.get('x'), geometry.get('y'))
+        else:
+            geometry_type = geometry.get('type')
+            if ('Point' == geometry_type):
+                point = geometry['coordinates'][:2]
+            elif ('Polygon' == geometry_type):
+                rings = geometry['coordinates']
+            elif ('MultiPolygon' == geometry_type):
+                rings = [ring for polygon_rings in geometry['coordinates'] for ring in polygon_rings]
+            else:
+                raise ValueError('Geometries of type {} cannot be decoded!'.format(geometry_type))
+
+        if rings is not None:
+            polygon = True
+            for ring in rings:
+                coordinates.extend(ring)
+                ring_offsets.append(len(coordinates))
+        else:
+            x.append(None if point is None else point[0])
+            y.append(None if point is None else point[1])
+        feature_offsets.append(len(ring_offsets) - 1)
+
+    attributes = { name: np.array(values) for (name, values) in attribute_values.items() }
+    if polygon:
+        if (0 < len(x) and any(value is not None for value in x)):
+            raise ValueError('Points and polygons cannot be decoded together!')
+
+        coordinate_array = np.array(coordinates, dtype=np.float64)[:, :2] if coordinates else np.empty((0, 2))
+        return FeatureColumns(attributes, coordinates=coordinate_array, ring_offsets=np.array(ring_offsets, dtype=np.int64), feature_offsets=np.array(feature_offsets, dtype=np.int64))
+
+    return FeatureColumns(attributes, x=np.array(x, dtype=np.float64), y=np.array(y, dtype=np.float64))
@@ -15,8 +15,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 # 
 
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum, unique
-from datetime import datetime
+from datetime import datetime, timedelta
+from . import streaming
+import asyncio
+import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import requests
 
 
@@ -40,23 +46,174 @@ class OutFormat(Enum):
 
 
 
+# Too many requests and the transient server errors are retried
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+def date_range(start, end):
+    """
+    Returns a list of all days between the start and the end date including both.
+    """
+    if (end < start):
+        raise ValueError('The end date must not be before the start date!')
+
+    return [start + timedelta(days=day) for day in range((end - start).days + 1)]
+
+def merge_features(dates, responses, format=OutFormat.GEOJSON):
+    """
+    Merges the GeoJSON or Esri JSON responses of several dates into one result.
+    Every feature gets a 'date' attribute formatted like '2022-05-01'.
+    Every response must be a feature collection, error payloads are rejected instead of being merged.
+    """
+    merged_features = []
+    for (date, response) in zip(dates, responses):
+        date_text = datetime.strftime(date, '%Y-%m-%d')
+        if not isinstance(response, dict) or 'error' in response or not isinstance(response.get('features', []), list):
+            raise ValueError('The response of {} does not contain any features!'.format(date_text))
+
+        for feature in response.get('features', []):
+            if (OutFormat.ESRI == format):
+                feature.setdefault('attributes', {})['date'] = date_text
+            else:
+                properties = feature.get('properties')
+                if properties is None:
+                    properties = feature['properties'] = {}
+                properties['date'] = date_text
+            merged_features.append(feature)
+
+    if (OutFormat.ESRI == format):
+        merged_response = { key: value for (key, value) in (responses[0] if responses else {}).items() if 'features' != key }
+        merged_response['fields'] = list(merged_response.get('fields', [])) + [{
+            'name': 'date',
+            'type': 'esriFieldTypeString',
+            'alias': 'date',
+            'length': 10
+        }]
+        merged_response['features'] = merged_features
+        return merged_response
+
+    return {
+        'type': 'FeatureCollection',
+        'features': merged_features
+    }
+
+def merge_articles(dates, responses):
+    """
+    Merges the article responses of several dates into one list.
+    Every response must be a list of articles or an object having an 'articles' list.
+    Every article gets a 'date' attribute formatted like '2022-05-01'.
+    """
+    merged_articles = []
+    for (date, response) in zip(dates, responses):
+        date_text = datetime.strftime(date, '%Y-%m-%d')
+        articles = response.get('articles') if isinstance(response, dict) else response
+        if not isinstance(articles, list):
+            raise ValueError('The response of {} does not contain any articles!'.format(date_text))
+
+        for article in articles:
+            if isinstance(article, dict):
+                article['date'] = date_text
+            merged_articles.append(article)
+
+    return merged_articles
+
 class GeoProtestClient(object):
     """
     Represents a client accessing the geoprotests API being hosted at Rapid API.
+    The client owns a pooled session keeping the connections alive, close it or use the client as a context manager.
     """
 
-    def __init__(self, url, auth_headers) -> None:
+    def __init__(self, url, auth_headers, pool_size=10, timeout=(3.05, 30.0), max_retries=3, backoff_factor=0.5, cache=None) -> None:
         """
         Initializes this instance using an url and an authorization header dictionary.
         The dictionary must contain 'x-rapidapi-host' and 'x-rapidapi-host' as keys.
+        The pool size limits the connections being kept alive, the timeout is in seconds or a tuple of connect and read timeout.
+        Requests failing with 429 or 5xx are retried with an exponential backoff honoring the 'Retry-After' header.
+        The optional response cache offers 'get(key)' and 'put(key, text, permanent)' like the ResponseCache does.
         """
         self._url = url
         if not 'x-rapidapi-host' in auth_headers:
             raise ValueError("'x-rapidapi-host' must be specified in the authorization header!")
         if not 'x-rapidapi-key' in auth_headers:
             raise ValueError("'x-rapidapi-key' must be specified in the authorization header!")
+        if (pool_size < 1):
+            raise ValueError('The pool size must be at least one!')
 
         self._auth_headers = auth_headers
+        self._pool_size = pool_size
+        self._timeout = timeout
+        self._cache = cache
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=['GET'],
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self._session = requests.Session()
+        self._session.headers.update(auth_headers)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Closes the pooled session and all of its connections.
+        """
+        self._session.close()
+
+    def _get(self, endpoint, params, stream=False):
+        """
+        Sends a GET request using the pooled session.
+        A streamed response body is not downloaded until it is read.
+        """
+        return self._session.get(endpoint, params=params, timeout=self._timeout, stream=stream)
+
+    def _iter_items(self, response, chunk_size, batch_size):
+        """
+        Yields the items of a streamed response one at a time or as lists of up to the batch size items.
+        """
+        with response:
+            response.raise_for_status()
+            items = streaming.iter_items(response.iter_content(chunk_size))
+            if batch_size:
+                yield from streaming.iter_batches(items, batch_size)
+            else:
+                yield from items
+
+    def _request_text(self, endpoint_name, date, format, request, raise_for_status=False):
+        """
+        Returns the response text from the cache or sends the request.
+        The responses of past dates never change and are cached permanently, the responses of the last 24 hours expire.
+        Only successful responses are cached, an HTTPError is raised for failed responses when requested.
+        """
+        if self._cache is None:
+            response = request()
+            if raise_for_status:
+                response.raise_for_status()
+            return response.text
+
+        key = (
+            '{0}/{1}'.format(self._url, endpoint_name),
+            datetime.strftime(date, '%Y-%m-%d') if date else None,
+            str(format) if format else None
+        )
+        text = self._cache.get(key)
+        if text is None:
+            response = request()
+            if raise_for_status:
+                response.raise_for_status()
+            text = response.text
+            if response.ok:
+                permanent = date is not None and date.date() < datetime.utcnow().date()
+                self._cache.put(key, text, permanent)
+
+        return text
 
     def aggregate(self, date=None, format=OutFormat.GEOJSON):
         """
@@ -65,7 +222,7 @@ class GeoProtestClient(object):
         The underlying hosted feature service saves the last 90 days and yesterday should be the latest available date.
         The format can be GeoJSON or Esri JSON.
         """
-        return self._request_aggregate(date, format).json()
+        return json.loads(self.aggregate_as_text(date, format))
     
     def aggregate_as_text(self, date=None, format=OutFormat.GEOJSON):
         """
@@ -74,7 +231,7 @@ class GeoProtestClient(object):
         The underlying hosted feature service saves the last 90 days and yesterday should be the latest available date.
         The format can be GeoJSON or Esri JSON.
         """
-        return self._request_aggregate(date, format).text
+        return self._request_text('aggregate', date, format, lambda: self._request_aggregate(date, format))
 
     def _request_aggregate(self, date=None, format=OutFormat.GEOJSON):
         """
@@ -90,9 +247,25 @@ class GeoProtestClient(object):
         if date:
             params['date'] = datetime.strftime(date, '%Y-%m-%d')
 
-        return requests.request('GET', endpoint, headers=self._auth_headers, params=params)
+        return self._get(endpoint, params)
 
     def articles(self, date=None):
+        """
+        Returns a list of broadcasted articles related to protests/demonstrations.
+        The date is optional. When not specified, we return the articles of the last 24 hours.
+        The underlying web service saves the last 90 days and yesterday should be the latest available date.
+        """
+        return json.loads(self._request_text('articles', date, None, lambda: self._request_articles(date)))
+
+    def iter_articles(self, date=None, batch_size=None, chunk_size=65536):
+        """
+        Yields the broadcasted articles related to protests/demonstrations one at a time or as lists of up to the batch size articles.
+        The response body is read in chunks, so that the memory is bounded by the chunk size and the largest article.
+        Streamed responses are never cached.
+        """
+        return self._iter_items(self._request_articles(date, stream=True), chunk_size, batch_size)
+
+    def _request_articles(self, date=None, stream=False):
         """
         Returns a list of broadcasted articles related to protests/demonstrations.
         The date is optional. When not specified, we return the articles of the last 24 hours.
@@ -103,7 +276,7 @@ class GeoProtestClient(object):
         if date:
             params['date'] = datetime.strftime(date, '%Y-%m-%d')
 
-        return requests.request('GET', endpoint, headers=self._auth_headers, params=params).json()
+        return self._get(endpoint, params, stream)
 
     def hotspots(self, date=None, format=OutFormat.GEOJSON):
         """
@@ -112,7 +285,7 @@ class GeoProtestClient(object):
         The underlying hosted feature service saves the last 90 days and yesterday should be the latest available date.
         The format can be GeoJSON or Esri JSON.
         """
-        return self._request_hotspots(date, format).json()
+        return json.loads(self.hotspots_as_text(date, format))
 
     def hotspots_as_text(self, date=None, format=OutFormat.GEOJSON):
         """
@@ -121,9 +294,17 @@ class GeoProtestClient(object):
         The underlying hosted feature service saves the last 90 days and yesterday should be the latest available date.
         The format can be GeoJSON or Esri JSON.
         """
-        return self._request_hotspots(date, format).text
+        return self._request_text('hotspots', date, format, lambda: self._request_hotspots(date, format))
+
+    def iter_hotspots(self, date=None, format=OutFormat.GEOJSON, batch_size=None, chunk_size=65536):
+        """
+        Yields the hotspot features related to protests/demonstrations one at a time or as lists of up to the batch size features.
+        The response body is read in chunks, so that the memory is bounded by the chunk size and the largest feature.
+        Streamed responses are never cached.
+        """
+        return self._iter_items(self._request_hotspots(date, format, stream=True), chunk_size, batch_size)
 
-    def _request_hotspots(self, date=None, format=OutFormat.GEOJSON):
+    def _request_hotspots(self, date=None, format=OutFormat.GEOJSON, stream=False):
         """
         Returns the hotspot locations related to protests/demonstrations.
         The date is optional. When not specified, we return the features of the last 24 hours.
@@ -137,4 +318,173 @@ class GeoProtestClient(object):
         if date:
             params['date'] = datetime.strftime(date, '%Y-%m-%d')
 
-        return requests.request('GET', endpoint, headers=self._auth_headers, params=params)
+        return self._get(endpoint, params, stream)
+
+    def _request_day(self, endpoint_name, date, format, request):
+        """
+        Returns the decoded response of one day being merged by the range methods.
+        Raises an HTTPError when the response failed after all retries, so that a failed day is never merged as data.
+        """
+        return json.loads(self._request_text(endpoint_name, date, format, request, raise_for_status=True))
+
+    def _aggregate_day(self, date, format=OutFormat.GEOJSON):
+        return self._request_day('aggregate', date, format, lambda: self._request_aggregate(date, format))
+
+    def _articles_day(self, date):
+        return self._request_day('articles', date, None, lambda: self._request_articles(date))
+
+    def _hotspots_day(self, date, format=OutFormat.GEOJSON):
+        return self._request_day('hotspots', date, format, lambda: self._request_hotspots(date, format))
+
+    def _request_range(self, method, dates, *args, max_workers=None):
+        """
+        Calls the method for every date using a thread pool and returns the results in the order of the dates.
+        The number of workers is bounded by the pool size, so that every worker reuses a pooled connection.
+        """
+        workers = min(max_workers or self._pool_size, self._pool_size, len(dates))
+        if (workers < 2):
+            return [method(date, *args) for date in dates]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda date: method(date, *args), dates))
+
+    def aggregate_range(self, start, end, format=OutFormat.GEOJSON, max_workers=None):
+        """
+        Returns the hexagonal bins of all days between the start and the end date as one GeoJSON or Esri JSON result.
+        The days are requested concurrently and every feature has a 'date' attribute.
+        An HTTPError is raised when any day fails.
+        """
+        dates = date_range(start, end)
+        return merge_features(dates, self._request_range(self._aggregate_day, dates, format, max_workers=max_workers), format)
+
+    def articles_range(self, start, end, max_workers=None):
+        """
+        Returns the broadcasted articles of all days between the start and the end date as one list.
+        The days are requested concurrently and every article has a 'date' attribute.
+        An HTTPError is raised when any day fails.
+        """
+        dates = date_range(start, end)
+        return merge_articles(dates, self._request_range(self._articles_day, dates, max_workers=max_workers))
+
+    def hotspots_range(self, start, end, format=OutFormat.GEOJSON, max_workers=None):
+        """
+        Returns the hotspot locations of all days between the start and the end date as one GeoJSON or Esri JSON result.
+        The days are requested concurrently and every feature has a 'date' attribute.
+        An HTTPError is raised when any day fails.
+        """
+        dates = date_range(start, end)
+        return merge_features(dates, self._request_range(self._hotspots_day, dates, format, max_workers=max_workers), format)
+
+
+
+class AsyncGeoProtestClient(object):
+    """
+    Represents an asyncio client accessing the geoprotests API being hosted at Rapid API.
+    Every request is sent by a pooled blocking client in a worker thread, so that the event loop is never blocked.
+    The number of concurrent requests is bounded, close the client or use it as an async context manager.
+    """
+
+    def __init__(self, url, auth_headers, max_concurrency=10, timeout=(3.05, 30.0), max_retries=3, backoff_factor=0.5, cache=None) -> None:
+        """
+        Initializes this instance using an url and an authorization header dictionary.
+        The dictionary must contain 'x-rapidapi-host' and 'x-rapidapi-host' as keys.
+        The maximum concurrency limits the requests being sent at the same time and the connections being kept alive.
+        The optional response cache is shared with the blocking client.
+        """
+        if (max_concurrency < 1):
+            raise ValueError('The maximum concurrency must be at least one!')
+
+        self._client = GeoProtestClient(url, auth_headers, max_concurrency, timeout, max_retries, backoff_factor, cache)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """
+        Closes the pooled session and all of its connections.
+        """
+        self._client.close()
+
+    async def _call(self, function, *args):
+        async with self._semaphore:
+            return await asyncio.to_thread(function, *args)
+
+    async def aggregate(self, date=None, format=OutFormat.GEOJSON):
+        """
+        Aggregates the broadcasted news related to protests/demonstrations using a spatial grid and returns the features as hexagonal bins.
+        The date is optional. When not specified, we return the features of the last 24 hours.
+        The format can be GeoJSON or Esri JSON.
+        """
+        return await self._call(self._client.aggregate, date, format)
+
+    async def aggregate_as_text(self, date=None, format=OutFormat.GEOJSON):
+        """
+        Aggregates the broadcasted news related to protests/demonstrations using a spatial grid and returns the features as hexagonal bins.
+        The date is optional. When not specified, we return the features of the last 24 hours.
+        The format can be GeoJSON or Esri JSON.
+        """
+        return await self._call(self._client.aggregate_as_text, date, format)
+
+    async def articles(self, date=None):
+        """
+        Returns a list of broadcasted articles related to protests/demonstrations.
+        The date is optional. When not specified, we return the articles of the last 24 hours.
+        """
+        return await self._call(self._client.articles, date)
+
+    async def hotspots(self, date=None, format=OutFormat.GEOJSON):
+        """
+        Returns the hotspot locations related to protests/demonstrations.
+        The date is optional. When not specified, we return the features of the last 24 hours.
+        The format can be GeoJSON or Esri JSON.
+        """
+        return await self._call(self._client.hotspots, date, format)
+
+    async def hotspots_as_text(self, date=None, format=OutFormat.GEOJSON):
+        """
+        Returns the hotspot locations related to protests/demonstrations.
+        The date is optional. When not specified, we return the features of the last 24 hours.
+        The format can be GeoJSON or Esri JSON.
+        """
+        return await self._call(self._client.hotspots_as_text, date, format)
+
+    async def gather(self, method, dates, *args):
+        """
+        Calls a coroutine method of this client like 'aggregate' for every date and returns the results in the order of the dates.
+        The requests are sent concurrently, but never more than the maximum concurrency at the same time.
+        """
+        return await asyncio.gather(*[method(date, *args) for date in dates])
+
+    async def _gather_days(self, function, dates, *args):
+        """
+        Calls a blocking day function of the client for every date and returns the results in the order of the dates.
+        """
+        return await asyncio.gather(*[self._call(function, date, *args) for date in dates])
+
+    async def aggregate_range(self, start, end, format=OutFormat.GEOJSON):
+        """
+        Returns the hexagonal bins of all days between the start and the end date as one GeoJSON or Esri JSON result.
+        Every feature has a 'date' attribute and an HTTPError is raised when any day fails.
+        """
+        dates = date_range(start, end)
+        return merge_features(dates, await self._gather_days(self._client._aggregate_day, dates, format), format)
+
+    async def articles_range(self, start, end):
+        """
+        Returns the broadcasted articles of all days between the start and the end date as one list.
+        Every article has a 'date' attribute and an HTTPError is raised when any day fails.
+        """
+        dates = date_range(start, end)
+        return merge_articles(dates, await self._gather_days(self._client._articles_day, dates))
+
+    async def hotspots_range(self, start, end, format=OutFormat.GEOJSON):
+        """
+        Returns the hotspot locations of all days between the start and the end date as one GeoJSON or Esri JSON result.
+        Every feature has a 'date' attribute and an HTTPError is raised when any day fails.
+        """
+        dates = date_range(start, end)
+        return merge_features(dates, await self._gather_days(self._client._hotspots_day, dates, format), format)
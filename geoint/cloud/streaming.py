@@ -0,0 +1,165 @@
+# geoint-py is a simple python module for geospatial intelligence workflows.
+# Copyright (C) 2022 Jan Tschada (gisfromscratch@live.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import codecs
+import json
+
+# The items of these arrays are yielded when the payload is a JSON object
+ITEM_KEYS = ('features', 'articles')
+
+WHITESPACE = ' \t\n\r'
+
+JSON_DECODER = json.JSONDecoder()
+
+
+
+class JsonTextStream(object):
+    """
+    Represents a text buffer being filled from byte chunks using an incremental UTF-8 decoder.
+    The consumed text is dropped, so that the buffer only holds the value being decoded.
+    """
+
+    def __init__(self, chunks) -> None:
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._position = 0
+        self._exhausted = False
+
+    def _fill(self):
+        """
+        Appends the next chunk to the buffer and returns False when all chunks are consumed.
+        """
+        if self._exhausted:
+            return False
+
+        if (len(self._buffer) // 2 < self._position):
+            self._buffer = self._buffer[self._position:]
+            self._position = 0
+
+        for chunk in self._chunks:
+            if chunk:
+                self._buffer += self._decoder.decode(chunk)
+                return True
+
+        self._buffer += self._decoder.decode(b'', final=True)
+        self._exhausted = True
+        return True
+
+    def peek(self):
+        """
+        Returns the next non-whitespace character without consuming it or None at the end of the stream.
+        """
+        while True:
+            while (self._position < len(self._buffer) and self._buffer[self._position] in WHITESPACE):
+                self._position += 1
+            if (self._position < len(self._buffer)):
+                return self._buffer[self._position]
+            if not self._fill():
+                return None
+
+    def expect(self, character):
+        """
+        Consumes the next non-whitespace character which must be the specified one.
+        """
+        if (character != self.peek()):
+            raise ValueError("The JSON payload is invalid, '{}' was expected!".format(character))
+        self._position += 1
+
+    def decode_value(self):
+        """
+        Decodes and consumes the next JSON value.
+        A value ending at the end of the buffer is only accepted when no more chunks follow, like a number being split by chunks.
+        An incomplete value is decoded again after the pending text has doubled, so that a value spanning many chunks is decoded a logarithmic number of times.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = JSON_DECODER.raw_decode(self._buffer, self._position)
+                if (end < len(self._buffer) or self._exhausted):
+                    self._position = end
+                    return value
+            except json.JSONDecodeError:
+                if self._exhausted:
+                    raise
+
+            pending_length = len(self._buffer) - self._position
+            while (len(self._buffer) - self._position < 2 * pending_length and self._fill()):
+                pass
+
+
+
+def _iter_array(stream):
+    stream.expect('[')
+    if (']' == stream.peek()):
+        stream.expect(']')
+        return
+
+    while True:
+        yield stream.decode_value()
+        if (']' == stream.peek()):
+            stream.expect(']')
+            return
+        stream.expect(',')
+
+def iter_items(chunks, item_keys=ITEM_KEYS):
+    """
+    Yields the items of a JSON payload one at a time while reading the byte chunks.
+    When the payload is an array its items are yielded, when it is an object the items of the arrays having one of the item keys are yielded.
+    Only one item and one chunk are held in memory at any time.
+    """
+    stream = JsonTextStream(chunks)
+    character = stream.peek()
+    if ('[' == character):
+        yield from _iter_array(stream)
+        return
+
+    if ('{' != character):
+        raise ValueError('The JSON payload must be an object or an array!')
+
+    stream.expect('{')
+    if ('}' == stream.peek()):
+        return
+
+    while True:
+        key = stream.decode_value()
+        stream.expect(':')
+        if (key in item_keys and '[' == stream.peek()):
+            yield from _iter_array(stream)
+        else:
+            stream.decode_value()
+
+        if ('}' == stream.peek()):
+            return
+        stream.expect(',')
+
+def iter_batches(items, batch_size):
+    """
+    Yields lists of up to the batch size items.
+    """
+    if (batch_size < 1):
+        raise ValueError('The batch size must be at least one!')
+
+    batch = []
+    for item in items:
+        batch.append(item)
+        if (batch_size == len(batch)):
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
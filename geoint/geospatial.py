@@ -15,11 +15,57 @@
 
 from arcgis.features import Feature, FeatureSet
 from arcgis.gis import GIS
-from arcgis.geometry import Envelope, Point, Polygon, SpatialReference
+from arcgis.geometry import Envelope, MultiPoint, Point, Polygon, Polyline, SpatialReference
 from arcgis.geometry import project as ago_project
-from arcgis.geometry.functions import relation as ago_relation
+from collections import OrderedDict
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from itertools import chain
-from math import ceil, floor, log, pi, tan
+from math import ceil, pi, sqrt
+from multiprocessing.shared_memory import SharedMemory
+import hashlib
+import numpy as np
+import os
+import re
+import requests
+import threading
+import time
+import weakref
+
+
+
+WGS84 = 4326
+WEB_MERCATOR = 3857
+WEB_MERCATOR_ALIASES = (3857, 3785, 102100, 102113, 900913)
+WEB_MERCATOR_MAX_LATITUDE = 85.0511287798066
+
+# Too many requests and the server errors are retried by the cloud engine
+TRANSIENT_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+
+def as_wkid(spatial_reference):
+    """
+    Returns the well-known id of a spatial reference being an integer, a string, a dictionary or a SpatialReference.
+    All the Web Mercator aliases are returned as 3857.
+    """
+    if isinstance(spatial_reference, dict):
+        if 'latestWkid' in spatial_reference:
+            spatial_reference = spatial_reference['latestWkid']
+        elif 'wkid' in spatial_reference:
+            spatial_reference = spatial_reference['wkid']
+        else:
+            raise ValueError('The spatial reference must define a well-known id!')
+
+    try:
+        wkid = int(spatial_reference)
+    except (TypeError, ValueError):
+        raise ValueError('{} is not a valid spatial reference!'.format(spatial_reference))
+
+    if wkid in WEB_MERCATOR_ALIASES:
+        return WEB_MERCATOR
+
+    return wkid
 
 
 
@@ -63,13 +109,108 @@ class grid_cell:
 
 
 
+class hexagonal_grid_cell:
+    """
+    Represents a flat-topped hexagonal spatial grid cell.
+    The size is the distance between the center and every vertex.
+    """
+    def __init__(self, center_x, center_y, size, wkid):
+        self._center_x = center_x
+        self._center_y = center_y
+        self._size = size
+        self._wkid = wkid
+
+    def wkid(self):
+        return self._wkid
+
+    def height(self):
+        return sqrt(3.0) * self._size
+
+    def width(self):
+        return 2.0 * self._size
+
+    def center_x(self):
+        return self._center_x
+
+    def center_y(self):
+        return self._center_y
+
+    def intersects(self, x, y):
+        dx = abs(x - self._center_x)
+        dy = abs(y - self._center_y)
+        return (dy <= 0.5 * self.height() and sqrt(3.0) * dx + dy <= sqrt(3.0) * self._size)
+
+    def as_ring(self):
+        half_size = 0.5 * self._size
+        half_height = 0.5 * self.height()
+        return [
+            [self._center_x - self._size, self._center_y],
+            [self._center_x - half_size, self._center_y + half_height],
+            [self._center_x + half_size, self._center_y + half_height],
+            [self._center_x + self._size, self._center_y],
+            [self._center_x + half_size, self._center_y - half_height],
+            [self._center_x - half_size, self._center_y - half_height],
+            [self._center_x - self._size, self._center_y]
+            ]
+
+
+
+def _npz_file_path(file_path):
+    """
+    Returns the file path having the '.npz' suffix which numpy appends when saving an archive.
+    """
+    file_path = os.fspath(file_path)
+    if not file_path.endswith('.npz'):
+        return file_path + '.npz'
+    return file_path
+
+
+
 class spatial_grid:
     """
     Represents a spatial grid.
+    Grids being built from construction params delegate the cell lookups to them, the subclasses define the grid type and the construction params type.
     """
+    grid_type = None
+    construct_params_type = None
+
     def __init__(self, cells, wkid):
         self._cells = cells
         self._wkid = wkid
+        self._construct = None
+        self._lazy = False
+
+    @classmethod
+    def build_from_params(cls, construct_params, lazy=False):
+        """
+        Builds a new grid using the construction params.
+        A lazy grid does not create any cells upfront, they are constructed on demand.
+        """
+        if lazy:
+            cells = grid_cell_view(construct_params)
+        else:
+            # Create all cells
+            cells = construct_params.construct_cells()
+        
+        # Create the grid and set the construction params
+        # these can be used for finding the cells intersecting with points later
+        grid = cls(cells, construct_params.wkid())
+        grid._construct = construct_params
+        grid._lazy = lazy
+        return grid
+
+    @classmethod
+    def load_from_arrays(cls, grid_arrays, lazy=None):
+        """
+        Builds a new grid using the arrays of a saved grid definition.
+        """
+        xmin, ymin, xmax, ymax = grid_arrays['extent'].tolist()
+        extent_cell = grid_cell(xmin, ymin, xmax, ymax, int(grid_arrays['wkid']))
+        construct_params = cls.construct_params_type(extent_cell, float(grid_arrays['cell_size']))
+        if lazy is None:
+            lazy = bool(grid_arrays['lazy'])
+
+        return cls.build_from_params(construct_params, lazy)
 
     def wkid(self):
         """
@@ -77,44 +218,95 @@ class spatial_grid:
         """
         return self._wkid
 
+    def is_lazy(self):
+        """
+        Returns whether the cells are constructed on demand.
+        """
+        return self._lazy
+
     def cells(self):
         """
         Returns all cells of this grid.
         """
-        raise NotImplementedError
+        return self._cells
     
     def cells_as_rings(self):
         """
         Returns all cells as a ring array used for constructing polygons.
         """
-        raise NotImplementedError
+        if self._lazy:
+            return grid_cell_view(self._construct, lambda cell: [cell.as_ring()])
+
+        return [[cell.as_ring()] for cell in self._cells]
 
     def find_index(self, x, y):
         """
         Returns the cell index or -1 when the specified coordinates do not intersect
         with any of these cells.
         """
-        raise NotImplementedError
+        return self._construct.find_index(x, y)
+
+    def find_indices(self, x, y):
+        """
+        Returns an array of cell indices for the specified coordinate arrays.
+        Coordinates not intersecting with any of these cells have an index of -1.
+        """
+        return self._construct.find_indices(x, y)
+
+    def cell_rows_and_columns(self, cell_indices):
+        """
+        Returns the row and column arrays of the specified cell indices.
+        """
+        return self._construct.rows_and_columns(cell_indices)
+
+    def cell_centers(self, cell_indices):
+        """
+        Returns the center x and center y arrays of the specified cell indices.
+        """
+        return self._construct.centers(cell_indices)
+
+    def save(self, file_path):
+        """
+        Saves the definition of this grid as numpy archive (*.npz), the suffix is appended when missing.
+        Only the construction params are saved, the cells are not.
+        """
+        if not self._construct:
+            raise ValueError('Only grids being built from construction params can be saved!')
+
+        extent = self._construct._extent
+        np.savez(_npz_file_path(file_path),
+                 grid_type=np.array(self.grid_type),
+                 extent=np.array([extent._xmin, extent._ymin, extent._xmax, extent._ymax], dtype=np.float64),
+                 cell_size=np.array(self._construct._cell_size, dtype=np.float64),
+                 wkid=np.array(self._wkid, dtype=np.int64),
+                 lazy=np.array(self._lazy))
     
     def intersect(self, x, y):
         """
         Returns the first cell which intersects with the specified coordinates.
         The coordinates must have the same spatial reference!
         """
-        raise NotImplementedError
+        if not self._construct:
+            return None
+
+        cell_index = self.find_index(x, y)
+        if -1 == cell_index:
+            return None
+        
+        return self._cells[cell_index]
 
 
 
-class rectangular_construct_params():
+class grid_construct_params():
     """
-    Represents the parameters for constructing a rectangular spatial grid.
-    The extent is defined by a grid_cell representing the full extent.
+    Represents the parameters for constructing a spatial grid whose cells are indexed column-wise.
+    The subclasses define the number of rows and columns and the geometry of the cells.
     """
     def __init__(self, extent, cell_size):
         self._extent = extent
         self._cell_size = cell_size
-        self._row_count = int(ceil(self._extent.height() / self._cell_size))
-        self._column_count = int(ceil(self._extent.width() / self._cell_size))
+        self._row_count = 0
+        self._column_count = 0
 
     def rows(self):
         return self._row_count
@@ -125,18 +317,49 @@ class rectangular_construct_params():
     def wkid(self):
         return self._extent.wkid()
 
+    def definition(self):
+        """
+        Returns a tuple of grid type, extent, cell size and wkid being equal for equal grids.
+        """
+        return (type(self).__name__, (self._extent._xmin, self._extent._ymin, self._extent._xmax, self._extent._ymax), float(self._cell_size), as_wkid(self.wkid()))
+
+    def cell_count(self):
+        return self._row_count * self._column_count
+
     def construct_cell(self, row, column):
-        cell_xmin = self._extent._xmin + (column * self._cell_size)
-        cell_ymin = self._extent._ymin + (row * self._cell_size)
-        cell_xmax = self._extent._xmin + ((column + 1) * self._cell_size)
-        cell_ymax = self._extent._ymin + ((row + 1) * self._cell_size)         
+        raise NotImplementedError
 
-        if self._column_count == column + 1:
-            cell_xmax = self._extent._xmax
-        if self._row_count == row + 1:
-            cell_ymax = self._extent._ymax
+    def construct_cell_at(self, index):
+        """
+        Constructs the cell using the column-wise cell index.
+        """
+        column, row = divmod(index, self._row_count)
+        return self.construct_cell(row, column)
 
-        return grid_cell(cell_xmin, cell_ymin, cell_xmax, cell_ymax, self._extent.wkid())
+    def rows_and_columns(self, cell_indices):
+        """
+        Returns the row and column arrays of the column-wise cell indices.
+        """
+        columns, rows = np.divmod(np.asarray(cell_indices, dtype=np.int64), self._row_count)
+        return rows, columns
+
+    def centers(self, cell_indices):
+        """
+        Returns the center x and center y arrays of the column-wise cell indices.
+        """
+        raise NotImplementedError
+
+    def vertices(self, cell_indices):
+        """
+        Returns the clockwise ordered vertices of the column-wise cell indices.
+        """
+        raise NotImplementedError
+
+    def cell_ranges(self, xmin, ymin, xmax, ymax):
+        """
+        Returns the first and last column and the first and last row of the cells intersecting with the envelope arrays.
+        """
+        raise NotImplementedError
 
     def construct_cells(self):
         """
@@ -155,272 +378,1485 @@ class rectangular_construct_params():
         Returns the cell index.
         Expects the cells were constructed column-wise!
         """
-        if not self._extent.intersects(x, y):
-            return -1
+        return int(self.find_indices([x], [y])[0])
 
-        column_index = int(floor((x - self._extent._xmin) / self._cell_size))
-        row_index = int(floor((y - self._extent._ymin) / self._cell_size))
-        return row_index + (self._row_count * column_index)
+    def find_indices(self, x, y):
+        """
+        Returns the cell indices of the coordinate arrays.
+        Coordinates outside of the extent have an index of -1.
+        """
+        raise NotImplementedError
 
 
 
-class rectangular_spatial_grid(spatial_grid):
+class rectangular_construct_params(grid_construct_params):
     """
-    Represents a rectangular spatial grid.
+    Represents the parameters for constructing a rectangular spatial grid.
+    The extent is defined by a grid_cell representing the full extent.
     """
-    def __init__(self, cells, wkid):
-        super().__init__(cells, wkid)
-
-    @staticmethod
-    def build_from_params(construct_params):
-        # Create all cells
-        cells = construct_params.construct_cells()
-        
-        # Create the grid and set the construction params
-        # these can be used for finding the cells intersecting with points later
-        grid = rectangular_spatial_grid(cells, construct_params.wkid())
-        grid._construct = construct_params
-        return grid
-
-    def cells(self):
-        return self._cells
-    
-    def cells_as_rings(self):
-        return [[cell.as_ring()] for cell in self._cells]
-
-    def find_index(self, x, y):
-        return self._construct.find_index(x, y)
-    
-    def intersect(self, x, y):
-        if not self._construct:
-            return None
+    def __init__(self, extent, cell_size):
+        super().__init__(extent, cell_size)
+        self._row_count = int(ceil(self._extent.height() / self._cell_size))
+        self._column_count = int(ceil(self._extent.width() / self._cell_size))
 
-        cell_index = self.find_index(x, y)
-        if -1 == cell_index:
-            return None
-        
-        return self._cells[cell_index]
+    def construct_cell(self, row, column):
+        cell_xmin = self._extent._xmin + (column * self._cell_size)
+        cell_ymin = self._extent._ymin + (row * self._cell_size)
+        cell_xmax = self._extent._xmin + ((column + 1) * self._cell_size)
+        cell_ymax = self._extent._ymin + ((row + 1) * self._cell_size)         
 
+        if self._column_count == column + 1:
+            cell_xmax = self._extent._xmax
+        if self._row_count == row + 1:
+            cell_ymax = self._extent._ymax
 
+        return grid_cell(cell_xmin, cell_ymin, cell_xmax, cell_ymax, self._extent.wkid())
 
-class spatial_grid_aggregation:
-    """
-    Represents a geometries in spatial grid aggregation.
-    """
-    def __init__(self, bins, wkid):
-        self._bins = bins
-        self._wkid = wkid
+    def centers(self, cell_indices):
+        """
+        Returns the center x and center y arrays of the column-wise cell indices.
+        The last row and column are clipped by the extent.
+        """
+        cell_xmin, cell_ymin, cell_xmax, cell_ymax = self._cell_bounds(cell_indices)
+        return 0.5 * (cell_xmin + cell_xmax), 0.5 * (cell_ymin + cell_ymax)
 
-    def bins(self):
+    def vertices(self, cell_indices):
         """
-        Returns a list of all bins.
+        Returns the clockwise ordered vertices of the column-wise cell indices as array having a shape of (n, 4, 2).
         """
-        return list(self._bins.values())
-    
-    def to_featureset(self):
+        cell_xmin, cell_ymin, cell_xmax, cell_ymax = self._cell_bounds(cell_indices)
+        return np.stack((
+            np.stack((cell_xmin, cell_ymin), axis=-1),
+            np.stack((cell_xmin, cell_ymax), axis=-1),
+            np.stack((cell_xmax, cell_ymax), axis=-1),
+            np.stack((cell_xmax, cell_ymin), axis=-1)
+        ), axis=1)
+
+    def _cell_bounds(self, cell_indices):
+        rows, columns = self.rows_and_columns(cell_indices)
+        cell_xmin = self._extent._xmin + (columns * self._cell_size)
+        cell_ymin = self._extent._ymin + (rows * self._cell_size)
+        cell_xmax = np.where(self._column_count == columns + 1, self._extent._xmax, cell_xmin + self._cell_size)
+        cell_ymax = np.where(self._row_count == rows + 1, self._extent._ymax, cell_ymin + self._cell_size)
+        return cell_xmin, cell_ymin, cell_xmax, cell_ymax
+
+    def cell_ranges(self, xmin, ymin, xmax, ymax):
         """
-        Return a feature set
+        Returns the first and last column and the first and last row of the cells intersecting with the envelope arrays.
+        Envelopes outside of the extent have a last index being less than the first index.
         """
-        bin_features = []
-        for bin_entry in self.bins():
-            bin_feature = Feature(
-                geometry=bin_entry['geometry'],
-                attributes={ 'hitCount': bin_entry['hitCount'] }
-            )
-            bin_features.append(bin_feature)
+        column_min = np.floor((np.asarray(xmin, dtype=np.float64) - self._extent._xmin) / self._cell_size).astype(np.int64)
+        column_max = np.floor((np.asarray(xmax, dtype=np.float64) - self._extent._xmin) / self._cell_size).astype(np.int64)
+        row_min = np.floor((np.asarray(ymin, dtype=np.float64) - self._extent._ymin) / self._cell_size).astype(np.int64)
+        row_max = np.floor((np.asarray(ymax, dtype=np.float64) - self._extent._ymin) / self._cell_size).astype(np.int64)
+        return _clip_cell_ranges(column_min, column_max, row_min, row_max, self._column_count, self._row_count)
 
-        bin_fields = ['hitCount']
-        return FeatureSet(bin_features, bin_fields, geometry_type='esriGeometryPolygon', spatial_reference=self._wkid)
+    def find_indices(self, x, y):
+        """
+        Returns the cell indices of the coordinate arrays using one vectorized floor division.
+        Coordinates outside of the extent have an index of -1.
+        Expects the cells were constructed column-wise!
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if (x.shape != y.shape):
+            raise ValueError("Coordinate arrays must have equal length!")
 
+        inside = (self._extent._xmin <= x) & (x <= self._extent._xmax) & (self._extent._ymin <= y) & (y <= self._extent._ymax)
+        column_indices = np.floor((x[inside] - self._extent._xmin) / self._cell_size).astype(np.int64)
+        row_indices = np.floor((y[inside] - self._extent._ymin) / self._cell_size).astype(np.int64)
+        np.minimum(column_indices, self._column_count - 1, out=column_indices)
+        np.minimum(row_indices, self._row_count - 1, out=row_indices)
 
+        cell_indices = np.full(x.shape, -1, dtype=np.int64)
+        cell_indices[inside] = row_indices + (self._row_count * column_indices)
+        return cell_indices
 
-class geospatial_engine:
+
+
+def _clip_cell_ranges(column_min, column_max, row_min, row_max, column_count, row_count):
     """
-    Represents a geospatial engine offering geospatial operations.
+    Clips the column and row ranges by the number of columns and rows.
+    Ranges outside of the grid end up with a last index being less than the first index.
     """
+    return (
+        np.clip(column_min, 0, column_count), np.clip(column_max, -1, column_count - 1),
+        np.clip(row_min, 0, row_count), np.clip(row_max, -1, row_count - 1)
+    )
 
-    def create_points(self, latitudes, longitudes):
-        """
-        Creates a list of points using the latitude and longitude arrays.
-        """
-        raise NotImplementedError
 
-    def create_spatial_grid(self, spacing_meters):
-        """
-        Create a spatial grid with the defined grid cell size in meters.
-        """
-        raise NotImplementedError
 
-    def aggregate(self, grid, geometries, wkid):
-        """
-        Returns the aggregation between grid cells which intersects the specified list of geometries.
-        """
-        raise NotImplementedError
+def _candidate_cells(construct_params, xmin, ymin, xmax, ymax):
+    """
+    Enumerates the cells of every envelope using the grid arithmetic.
+    Returns the positions of the envelopes and the cell indices as parallel arrays.
+    """
+    column_min, column_max, row_min, row_max = construct_params.cell_ranges(xmin, ymin, xmax, ymax)
+    column_counts = np.maximum(column_max - column_min + 1, 0)
+    row_counts = np.maximum(row_max - row_min + 1, 0)
+    cell_counts = column_counts * row_counts
+    owners = np.repeat(np.arange(len(cell_counts)), cell_counts)
+    local_indices = np.arange(cell_counts.sum()) - np.repeat(np.cumsum(cell_counts) - cell_counts, cell_counts)
+    columns = column_min[owners] + (local_indices // row_counts[owners])
+    rows = row_min[owners] + (local_indices % row_counts[owners])
+    return owners, rows + (construct_params.rows() * columns)
 
-    def project(self, geometries, in_sr, out_sr):
-        """
-        Projects the list of geometries from in_sr into out_sr.
-        """
-        raise NotImplementedError
 
 
+def _segments_intersect_cells(construct_params, segments, cell_indices):
+    """
+    Tests every segment against its convex cell using the separating axis theorem.
+    The segments are an array having a shape of (n, 2, 2), touching boundaries count as intersection.
+    """
+    vertices = construct_params.vertices(cell_indices)
+    edges = np.roll(vertices, -1, axis=1) - vertices
+    segment_directions = segments[:, 1] - segments[:, 0]
+    axes = np.concatenate((
+        np.stack((-edges[..., 1], edges[..., 0]), axis=-1),
+        np.stack((-segment_directions[:, 1], segment_directions[:, 0]), axis=-1)[:, np.newaxis, :]
+    ), axis=1)
+    cell_projections = np.einsum('nak,nvk->nav', axes, vertices)
+    segment_projections = np.einsum('nak,nsk->nas', axes, segments)
+    separated = (segment_projections.max(axis=-1) < cell_projections.min(axis=-1)) | (cell_projections.max(axis=-1) < segment_projections.min(axis=-1))
+    return ~separated.any(axis=1)
 
-class ago_geospatial_engine(geospatial_engine):
+
+
+def _points_in_rings(x, y, segments, chunk_size=1 << 22):
     """
-    Represents a geospatial engine using ArcGIS Online.
+    Tests whether the points are inside the rings using the even-odd rule.
+    The segments of all rings are an array having a shape of (n, 2, 2).
     """
-    def __init__(self):
-        super().__init__()
+    x0 = segments[:, 0, 0]
+    y0 = segments[:, 0, 1]
+    x1 = segments[:, 1, 0]
+    y1 = segments[:, 1, 1]
+    inside = np.zeros(len(x), dtype=bool)
+    points_per_chunk = max(1, chunk_size // max(1, len(segments)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start in range(0, len(x), points_per_chunk):
+            px = x[start: start + points_per_chunk, np.newaxis]
+            py = y[start: start + points_per_chunk, np.newaxis]
+            crosses = ((y0 > py) != (y1 > py)) & (px < (x1 - x0) * (py - y0) / (y1 - y0) + x0)
+            inside[start: start + points_per_chunk] = 1 == (np.count_nonzero(crosses, axis=1) % 2)
 
-    def __enter__(self):
-        self._gis = GIS()
-        return self
+    return inside
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        if (self._gis._con and self._gis._con._session):
-            self._gis._con._session.close()
 
-        del self._gis
-        self._gis = None
 
-    def create_points(self, latitudes, longitudes):
-        if (len(latitudes) != len(longitudes)):
-            raise ValueError("Coordinate arrays must have equal length!")
+def _path_segments(path):
+    """
+    Returns the segments of a path or ring as array having a shape of (n, 2, 2).
+    """
+    coordinates = np.asarray([vertex[:2] for vertex in path], dtype=np.float64).reshape(-1, 2)
+    return np.stack((coordinates[:-1], coordinates[1:]), axis=1)
 
-        return [Point({
-            'x': longitude,
-            'y': latitude
-        }) for (longitude, latitude) in zip(longitudes, latitudes)]
-    
-    def create_spatial_grid(self, spacing_meters):
-        # Use WGS84 and reproject to Web Mercator
-        envelope_wgs84 = Envelope({
-            'xmin': -180.0, 
-            'ymin': -90.0, 
-            'xmax': 180.0, 
-            'ymax': 90.0, 
-            'spatialReference': {'wkid': 4326}
-        })
-        input_geometries = [envelope_wgs84]
-        projected_geometries = self.project(input_geometries, in_sr='4326', out_sr='3857')
-        envelope_mercator = projected_geometries[0]
 
-        extent_cell = grid_cell(envelope_mercator.xmin, envelope_mercator.ymin, envelope_mercator.xmax, envelope_mercator.ymax, 3857)
-        construct_params = rectangular_construct_params(extent_cell, spacing_meters)
-        return rectangular_spatial_grid.build_from_params(construct_params)
-    
-    def project(self, geometries, in_sr, out_sr):
-        if (0 == len(geometries)):
-            return []
 
-        # Special cases (WGS84 points to Web Mercator)
-        first_geometry = geometries[0]
-        if ('Point' == first_geometry.type
-            and 4326 == in_sr and 3857 == out_sr):
-            return self._project_points_from_wgs84_to_web_mercator(geometries)
+def _split_segments(segments, max_length):
+    """
+    Splits the segments into pieces not being longer than the maximum length.
+    """
+    lengths = np.hypot(segments[:, 1, 0] - segments[:, 0, 0], segments[:, 1, 1] - segments[:, 0, 1])
+    piece_counts = np.maximum(np.ceil(lengths / max_length), 1).astype(np.int64)
+    owners = np.repeat(np.arange(len(segments)), piece_counts)
+    pieces = np.arange(len(owners)) - np.repeat(np.cumsum(piece_counts) - piece_counts, piece_counts)
+    starts = segments[owners, 0]
+    directions = (segments[owners, 1] - starts) / piece_counts[owners, np.newaxis]
+    return owners, np.stack((starts + directions * pieces[:, np.newaxis], starts + directions * (pieces + 1)[:, np.newaxis]), axis=1)
 
-        chunk_size = 1000
-        if (len(geometries) <= chunk_size):
-            return ago_project(geometries, in_sr, out_sr)
-        
-        raise ValueError('Only {} geometries allowed!'.format(chunk_size))
-
-        # Use an offline projection engine
-        '''
-        geometries_chunked = lambda geometries, chunk_size: [geometries[index: index + chunk_size] for index in range(0, len(geometries), chunk_size)]
-        geometries_projected = []
-        for chunk in geometries_chunked:
-            chunk_projected = ago_project(chunk, in_sr, out_sr)
-            geometries_projected.extend(chunk_projected)
-        
-        return geometries_projected
-        '''
-        #return list(chain(*[ago_project(chunk, in_sr, out_sr) for chunk in geometries_chunked]))
 
-    def _project_points_from_wgs84_to_web_mercator(self, wgs84_points):
-        major_axis = 6378137
-        major_shift = pi * major_axis
-        return [Point({
-            'x': wgs84_point.x * major_shift / 180.0,
-            'y': (log(tan((90.0 + wgs84_point.y) * pi / 360.0)) / (pi / 180.0)) * major_shift / 180.0
-        }) for wgs84_point in wgs84_points]
+
+class grid_cell_view(Sequence):
+    """
+    Represents a read-only sequence of grid cells which are constructed on demand.
+    The optional cell function converts every constructed cell, e.g. into a ring array.
+    """
+    def __init__(self, construct_params, cell_function=None):
+        self._construct = construct_params
+        self._cell_function = cell_function
+
+    def __len__(self):
+        return self._construct.cell_count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[cell_index] for cell_index in range(*index.indices(len(self)))]
+
+        cell_count = len(self)
+        if index < 0:
+            index += cell_count
+        if index < 0 or cell_count <= index:
+            raise IndexError('The cell index is out of range!')
+
+        cell = self._construct.construct_cell_at(index)
+        if self._cell_function:
+            return self._cell_function(cell)
+        
+        return cell
+
+    def __iter__(self):
+        for cell_index in range(len(self)):
+            cell = self._construct.construct_cell_at(cell_index)
+            yield self._cell_function(cell) if self._cell_function else cell
+
+
+
+class rectangular_spatial_grid(spatial_grid):
+    """
+    Represents a rectangular spatial grid.
+    """
+    grid_type = 'rectangular'
+    construct_params_type = rectangular_construct_params
+
+
+
+class hexagonal_construct_params(grid_construct_params):
+    """
+    Represents the parameters for constructing a hexagonal spatial grid of flat-topped hexagons.
+    The extent is defined by a grid_cell representing the full extent and the cell size is the distance between center and vertex.
+    The first cell is centered at the lower left corner of the extent and every odd column is shifted up by half a cell height.
+    """
+    def __init__(self, extent, cell_size):
+        super().__init__(extent, cell_size)
+        self._cell_height = sqrt(3.0) * cell_size
+        self._column_count = int(ceil(self._extent.width() / (1.5 * self._cell_size))) + 1
+        self._row_count = int(ceil(self._extent.height() / self._cell_height)) + 1
+
+    def construct_cell(self, row, column):
+        center_x = self._extent._xmin + (1.5 * self._cell_size * column)
+        center_y = self._extent._ymin + (self._cell_height * (row + 0.5 * (column & 1)))
+        return hexagonal_grid_cell(center_x, center_y, self._cell_size, self._extent.wkid())
+
+    def centers(self, cell_indices):
+        """
+        Returns the center x and center y arrays of the column-wise cell indices.
+        """
+        rows, columns = self.rows_and_columns(cell_indices)
+        center_x = self._extent._xmin + (1.5 * self._cell_size * columns)
+        center_y = self._extent._ymin + (self._cell_height * (rows + 0.5 * (columns & 1)))
+        return center_x, center_y
+
+    def vertices(self, cell_indices):
+        """
+        Returns the clockwise ordered vertices of the column-wise cell indices as array having a shape of (n, 6, 2).
+        """
+        center_x, center_y = self.centers(cell_indices)
+        half_size = 0.5 * self._cell_size
+        half_height = 0.5 * self._cell_height
+        offsets = np.array([
+            [-self._cell_size, 0.0],
+            [-half_size, half_height],
+            [half_size, half_height],
+            [self._cell_size, 0.0],
+            [half_size, -half_height],
+            [-half_size, -half_height]
+        ])
+        return np.stack((center_x, center_y), axis=-1)[:, np.newaxis, :] + offsets
+
+    def cell_ranges(self, xmin, ymin, xmax, ymax):
+        """
+        Returns the first and last column and the first and last row of the cells which may intersect with the envelope arrays.
+        The row ranges are conservative and cover the shifted odd columns as well.
+        Envelopes outside of the extent have a last index being less than the first index.
+        """
+        column_spacing = 1.5 * self._cell_size
+        column_min = np.ceil((np.asarray(xmin, dtype=np.float64) - self._cell_size - self._extent._xmin) / column_spacing).astype(np.int64)
+        column_max = np.floor((np.asarray(xmax, dtype=np.float64) + self._cell_size - self._extent._xmin) / column_spacing).astype(np.int64)
+        row_min = np.floor((np.asarray(ymin, dtype=np.float64) - self._extent._ymin) / self._cell_height - 1.0).astype(np.int64)
+        row_max = np.floor((np.asarray(ymax, dtype=np.float64) - self._extent._ymin) / self._cell_height + 0.5).astype(np.int64)
+        return _clip_cell_ranges(column_min, column_max, row_min, row_max, self._column_count, self._row_count)
+
+    def find_indices(self, x, y):
+        """
+        Returns the cell indices of the coordinate arrays using axial coordinates and cube rounding.
+        Coordinates outside of the extent have an index of -1.
+        Expects the cells were constructed column-wise!
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if (x.shape != y.shape):
+            raise ValueError("Coordinate arrays must have equal length!")
+
+        inside = (self._extent._xmin <= x) & (x <= self._extent._xmax) & (self._extent._ymin <= y) & (y <= self._extent._ymax)
+        offset_x = x[inside] - self._extent._xmin
+        offset_y = y[inside] - self._extent._ymin
+
+        # Fractional axial coordinates of flat-topped hexagons
+        axial_q = (2.0 / 3.0 * offset_x) / self._cell_size
+        axial_r = (-1.0 / 3.0 * offset_x + sqrt(3.0) / 3.0 * offset_y) / self._cell_size
+
+        # Round the cube coordinates and fix the component having the largest rounding error
+        cube_x = np.rint(axial_q)
+        cube_z = np.rint(axial_r)
+        cube_y = np.rint(-axial_q - axial_r)
+        delta_x = np.abs(cube_x - axial_q)
+        delta_y = np.abs(cube_y + axial_q + axial_r)
+        delta_z = np.abs(cube_z - axial_r)
+        fix_x = (delta_x > delta_y) & (delta_x > delta_z)
+        fix_z = ~fix_x & (delta_y <= delta_z)
+        cube_x = np.where(fix_x, -cube_y - cube_z, cube_x)
+        cube_z = np.where(fix_z, -cube_x - cube_y, cube_z)
+
+        # Convert into odd-q offset coordinates, cells touching the border are clipped
+        column_indices = cube_x.astype(np.int64)
+        row_indices = cube_z.astype(np.int64) + ((column_indices - (column_indices & 1)) // 2)
+        np.clip(column_indices, 0, self._column_count - 1, out=column_indices)
+        np.clip(row_indices, 0, self._row_count - 1, out=row_indices)
+
+        cell_indices = np.full(x.shape, -1, dtype=np.int64)
+        cell_indices[inside] = row_indices + (self._row_count * column_indices)
+        return cell_indices
+
+
+
+class hexagonal_spatial_grid(spatial_grid):
+    """
+    Represents a hexagonal spatial grid.
+    """
+    grid_type = 'hexagonal'
+    construct_params_type = hexagonal_construct_params
+
+
+
+def load_spatial_grid(file_path, lazy=None):
+    """
+    Loads a spatial grid being saved as numpy archive.
+    The '.npz' suffix is appended when missing, like saving the grid does.
+    The lazy flag overwrites the saved construction mode when specified.
+    """
+    with np.load(_npz_file_path(file_path)) as grid_arrays:
+        grid_type = str(grid_arrays['grid_type'])
+        for grid_class in (rectangular_spatial_grid, hexagonal_spatial_grid):
+            if (grid_class.grid_type == grid_type):
+                return grid_class.load_from_arrays(grid_arrays, lazy)
+
+    raise ValueError('The grid type {} is not supported!'.format(grid_type))
+
+
+
+class spatial_grid_cache:
+    """
+    Represents a thread-safe cache of spatial grids keyed by grid type, spacing, extent, wkid and construction mode.
+    Lazy grids only hold their construction params and are kept until the least recently used ones are evicted when the maximum size is exceeded.
+    Eager grids hold all of their cells, e.g. about 640k cells for a 50 km grid, so they are only cached as long as they are referenced elsewhere.
+    When a directory is specified, the grid definitions are saved and reused by other processes.
+    """
+    def __init__(self, max_size=16, directory=None):
+        if (max_size < 1):
+            raise ValueError('The maximum size must be greater than zero!')
+
+        self._max_size = max_size
+        self._directory = directory
+        self._grids = OrderedDict()
+        self._eager_grids = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._grids) + len(self._eager_grids)
+
+    def get_or_create(self, grid_type, spacing_meters, extent, wkid, lazy, create_grid):
+        """
+        Returns the cached grid or creates a new one using the specified function.
+        The extent is a tuple of xmin, ymin, xmax and ymax.
+        """
+        key = (grid_type, float(spacing_meters), tuple(float(coordinate) for coordinate in extent), as_wkid(wkid), bool(lazy))
+        with self._lock:
+            if key in self._grids:
+                self._grids.move_to_end(key)
+                return self._grids[key]
+
+            grid = self._eager_grids.get(key)
+            if grid is not None:
+                return grid
+
+        file_path = self._file_path(key)
+        if file_path and os.path.exists(file_path):
+            grid = load_spatial_grid(file_path, lazy)
+        else:
+            grid = create_grid()
+            if file_path:
+                # Other processes must never load a partially written file
+                temp_file_path = '{0}.{1}.{2}.npz'.format(file_path, os.getpid(), threading.get_ident())
+                grid.save(temp_file_path)
+                os.replace(temp_file_path, file_path)
+
+        with self._lock:
+            if not lazy:
+                self._eager_grids[key] = grid
+                return grid
+
+            self._grids[key] = grid
+            self._grids.move_to_end(key)
+            while (self._max_size < len(self._grids)):
+                self._grids.popitem(last=False)
+
+        return grid
+
+    def _file_path(self, key):
+        if not self._directory:
+            return None
+
+        key_hash = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self._directory, '{0}_{1}.npz'.format(key[0], key_hash))
+
+    def clear(self):
+        """
+        Removes all grids from memory, the saved grid definitions are kept.
+        """
+        with self._lock:
+            self._grids.clear()
+
+
+
+class spatial_grid_aggregation:
+    """
+    Represents a geometries in spatial grid aggregation.
+    The occupied cells are stored as parallel numpy arrays of cell indices and hit counts sorted by the cell index.
+    The polygons of the occupied cells are only created on demand.
+    The optional point index maps every occupied cell to the positions of its input points using CSR-style arrays.
+    The optional statistics map field names like 'fatalities_sum' to arrays being parallel to the cell indices.
+    """
+    def __init__(self, grid, cell_indices, hit_counts, wkid, point_offsets=None, point_positions=None, statistics=None):
+        self._grid = grid
+        self._cell_indices = np.asanyarray(cell_indices, dtype=np.int64)
+        self._hit_counts = np.asanyarray(hit_counts, dtype=np.int64)
+        self._wkid = wkid
+        if (self._cell_indices.shape != self._hit_counts.shape):
+            raise ValueError('The cell indices and hit counts must have equal length!')
+
+        self._point_offsets = None if point_offsets is None else np.asanyarray(point_offsets, dtype=np.int64)
+        self._point_positions = None if point_positions is None else np.asanyarray(point_positions, dtype=np.int64)
+        if (self._point_offsets is not None and len(self._cell_indices) + 1 != len(self._point_offsets)):
+            raise ValueError('The point offsets must have one entry more than the cell indices!')
+
+        self._statistics = dict(statistics) if statistics else dict()
+        for (field_name, statistic_values) in self._statistics.items():
+            if (len(self._cell_indices) != len(statistic_values)):
+                raise ValueError('The statistic {} must have one value for every cell!'.format(field_name))
+
+    @staticmethod
+    def empty(grid, wkid):
+        """
+        Creates an aggregation without any occupied cells.
+        """
+        return spatial_grid_aggregation(grid, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), wkid)
+
+    def grid(self):
+        """
+        Returns the spatial grid of this aggregation.
+        """
+        return self._grid
+
+    def wkid(self):
+        """
+        Returns the well-known id of the spatial reference.
+        """
+        return self._wkid
+
+    def __len__(self):
+        return len(self._cell_indices)
+
+    def cell_indices(self):
+        """
+        Returns the indices of all occupied cells as numpy array.
+        """
+        return self._cell_indices
+
+    def hit_counts(self):
+        """
+        Returns a dictionary mapping the cell index to the hit count of every occupied cell.
+        """
+        return dict(zip(self._cell_indices.tolist(), self._hit_counts.tolist()))
+
+    def statistics(self):
+        """
+        Returns a dictionary mapping the field names of the statistics to arrays being parallel to the cell indices.
+        """
+        return dict(self._statistics)
+
+    def has_point_index(self):
+        """
+        Returns whether this aggregation maps the occupied cells to the positions of the input points.
+        """
+        return self._point_offsets is not None
+
+    def point_index(self):
+        """
+        Returns the offsets and positions arrays of the point index.
+        The positions of the points in the n-th occupied cell are positions[offsets[n]:offsets[n + 1]].
+        """
+        if not self.has_point_index():
+            raise ValueError('The aggregation was created without a point index!')
+
+        return self._point_offsets, self._point_positions
+
+    def point_positions(self, cell_index):
+        """
+        Returns the positions of the input points intersecting with the specified cell.
+        """
+        if not self.has_point_index():
+            raise ValueError('The aggregation was created without a point index!')
+
+        bin_index = np.searchsorted(self._cell_indices, cell_index)
+        if (len(self._cell_indices) <= bin_index or cell_index != self._cell_indices[bin_index]):
+            return np.empty(0, dtype=np.int64)
+
+        return self._point_positions[self._point_offsets[bin_index]: self._point_offsets[bin_index + 1]]
+
+    def columns(self, rows_and_columns=True, centers=True):
+        """
+        Returns the aggregation as dictionary of parallel numpy arrays.
+        The row and column indices and the cell centers are optional and derived from the grid.
+        """
+        columns = {
+            'cellIndex': self._cell_indices,
+            'hitCount': self._hit_counts
+        }
+        columns.update(self._statistics)
+        if rows_and_columns:
+            columns['row'], columns['column'] = self._grid.cell_rows_and_columns(self._cell_indices)
+        if centers:
+            columns['centerX'], columns['centerY'] = self._grid.cell_centers(self._cell_indices)
+        
+        return columns
+
+    def to_dataframe(self, rows_and_columns=True, centers=True):
+        """
+        Returns a pandas dataframe backed by the numpy arrays of this aggregation.
+        """
+        import pandas
+        return pandas.DataFrame(self.columns(rows_and_columns, centers), copy=False)
+
+    def to_arrow(self, rows_and_columns=True, centers=True):
+        """
+        Returns a pyarrow table backed by the numpy arrays of this aggregation.
+        The numeric arrays are wrapped without copying them.
+        """
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError('The pyarrow package is required for exporting an aggregation as arrow table!')
+
+        return pyarrow.table(self.columns(rows_and_columns, centers))
+
+    def save(self, directory_path):
+        """
+        Saves this aggregation into a directory.
+        The grid definition is saved as numpy archive and every column as numpy array file (*.npy).
+        """
+        os.makedirs(directory_path, exist_ok=True)
+        self._grid.save(os.path.join(directory_path, 'grid.npz'))
+        np.save(os.path.join(directory_path, 'cellIndex.npy'), self._cell_indices)
+        np.save(os.path.join(directory_path, 'hitCount.npy'), self._hit_counts)
+        if self.has_point_index():
+            np.save(os.path.join(directory_path, 'pointOffsets.npy'), self._point_offsets)
+            np.save(os.path.join(directory_path, 'pointPositions.npy'), self._point_positions)
+        field_names = list(self._statistics.keys())
+        for (field_index, field_name) in enumerate(field_names):
+            np.save(os.path.join(directory_path, 'statistic_{}.npy'.format(field_index)), self._statistics[field_name])
+        np.savez(os.path.join(directory_path, 'aggregation.npz'), wkid=np.array(self._wkid, dtype=np.int64), statistics=np.array(field_names, dtype=str))
+
+    @staticmethod
+    def load(directory_path, mmap_mode='r', lazy=True):
+        """
+        Loads an aggregation being saved into a directory.
+        The arrays are memory-mapped by default and the grid constructs its cells on demand.
+        """
+        grid = load_spatial_grid(os.path.join(directory_path, 'grid.npz'), lazy)
+        cell_indices = np.load(os.path.join(directory_path, 'cellIndex.npy'), mmap_mode=mmap_mode)
+        hit_counts = np.load(os.path.join(directory_path, 'hitCount.npy'), mmap_mode=mmap_mode)
+        with np.load(os.path.join(directory_path, 'aggregation.npz')) as aggregation_arrays:
+            wkid = int(aggregation_arrays['wkid'])
+            field_names = aggregation_arrays['statistics'].tolist() if 'statistics' in aggregation_arrays else []
+
+        statistics = dict()
+        for (field_index, field_name) in enumerate(field_names):
+            statistics[field_name] = np.load(os.path.join(directory_path, 'statistic_{}.npy'.format(field_index)), mmap_mode=mmap_mode)
+
+        point_offsets = None
+        point_positions = None
+        if os.path.exists(os.path.join(directory_path, 'pointOffsets.npy')):
+            point_offsets = np.load(os.path.join(directory_path, 'pointOffsets.npy'), mmap_mode=mmap_mode)
+            point_positions = np.load(os.path.join(directory_path, 'pointPositions.npy'), mmap_mode=mmap_mode)
+
+        return spatial_grid_aggregation(grid, cell_indices, hit_counts, wkid, point_offsets, point_positions, statistics)
+
+    def bins(self):
+        """
+        Returns a list of all bins.
+        """
+        cells = self._grid.cells()
+        bins = [{
+            'geometry': Polygon({
+                'rings': [cells[grid_index].as_ring()]
+            }),
+            'hitCount': hit_count
+        } for (grid_index, hit_count) in zip(self._cell_indices.tolist(), self._hit_counts.tolist())]
+        for (field_name, statistic_values) in self._statistics.items():
+            for (bin_entry, statistic_value) in zip(bins, statistic_values.tolist()):
+                bin_entry[field_name] = statistic_value
+
+        return bins
     
+    def to_featureset(self):
+        """
+        Return a feature set
+        """
+        bin_fields = ['hitCount'] + list(self._statistics.keys())
+        bin_features = []
+        for bin_entry in self.bins():
+            bin_feature = Feature(
+                geometry=bin_entry['geometry'],
+                attributes={ bin_field: bin_entry[bin_field] for bin_field in bin_fields }
+            )
+            bin_features.append(bin_feature)
+
+        return FeatureSet(bin_features, bin_fields, geometry_type='esriGeometryPolygon', spatial_reference=self._wkid)
+
+
+
+def _reduce_hit_counts(cell_indices, hit_counts):
+    """
+    Sums up the hit counts of equal cell indices and returns the sorted unique cell indices and their hit counts.
+    """
+    grid_indices, inverse_indices = np.unique(cell_indices, return_inverse=True)
+    summed_counts = np.bincount(inverse_indices, weights=hit_counts, minlength=len(grid_indices))
+    return grid_indices, summed_counts.astype(np.int64)
+
+
+
+STATISTICS = ('sum', 'mean', 'min', 'max', 'count_distinct')
+
+def _reduce_statistics(inverse_indices, hit_counts, values, statistics):
+    """
+    Computes the statistics of every value column for every occupied cell.
+    The inverse indices map every value to its occupied cell, the values are a dictionary of columns.
+    Missing values like NaN and None are skipped, a cell without any value has a sum of zero and NaN for the other statistics.
+    Returns a dictionary mapping field names like 'fatalities_sum' to arrays being parallel to the hit counts.
+    """
+    for statistic in statistics:
+        if not statistic in STATISTICS:
+            raise ValueError('The statistic {0} is not supported, use one of {1}!'.format(statistic, STATISTICS))
+
+    import pandas
+    bin_count = len(hit_counts)
+    sort_order = np.argsort(inverse_indices, kind='stable')
+    bin_offsets = np.zeros(bin_count, dtype=np.int64)
+    np.cumsum(hit_counts[:-1], out=bin_offsets[1:])
+    results = dict()
+    for (value_name, value_column) in values.items():
+        value_column = np.asarray(value_column)
+        if (len(inverse_indices) != len(value_column)):
+            raise ValueError('The value column {} must have one value for every location!'.format(value_name))
+
+        # Missing values are skipped like pandas does
+        missing = pandas.isna(value_column)
+        has_missing = missing.any()
+        if has_missing:
+            value_counts = np.bincount(inverse_indices[~missing], minlength=bin_count)
+        else:
+            value_counts = hit_counts
+
+        for statistic in statistics:
+            field_name = '{0}_{1}'.format(value_name, statistic)
+            if (0 == bin_count):
+                results[field_name] = np.empty(0, dtype=np.float64)
+            elif ('sum' == statistic or 'mean' == statistic):
+                weights = np.where(missing, 0.0, value_column).astype(np.float64) if has_missing else value_column
+                sums = np.bincount(inverse_indices, weights=weights, minlength=bin_count)
+                if ('sum' == statistic):
+                    results[field_name] = sums
+                else:
+                    results[field_name] = np.where(0 < value_counts, sums / np.maximum(value_counts, 1), np.nan)
+            elif ('min' == statistic or 'max' == statistic):
+                reduce_function = np.minimum if ('min' == statistic) else np.maximum
+                if has_missing:
+                    fill_value = np.inf if ('min' == statistic) else -np.inf
+                    sorted_values = np.where(missing, fill_value, value_column).astype(np.float64)[sort_order]
+                    results[field_name] = np.where(0 < value_counts, reduce_function.reduceat(sorted_values, bin_offsets), np.nan)
+                else:
+                    results[field_name] = reduce_function.reduceat(value_column[sort_order], bin_offsets)
+            elif ('count_distinct' == statistic):
+                value_codes, _ = pandas.factorize(value_column)
+                present = -1 != value_codes
+                pair_order = np.lexsort((value_codes[present], inverse_indices[present]))
+                sorted_bins = inverse_indices[present][pair_order]
+                sorted_codes = value_codes[present][pair_order]
+                first_pairs = np.ones(len(pair_order), dtype=bool)
+                first_pairs[1:] = (sorted_bins[1:] != sorted_bins[:-1]) | (sorted_codes[1:] != sorted_codes[:-1])
+                results[field_name] = np.bincount(sorted_bins[first_pairs], minlength=bin_count)
+
+    return results
+
+
+
+def _bin_shared_coordinates(construct_params, shared_memory_name, coordinate_count, start, stop):
+    """
+    Bins a slice of the coordinates being stored in shared memory and returns the occupied cell indices and hit counts.
+    This function is executed by the worker processes.
+    """
+    shared_memory = SharedMemory(name=shared_memory_name)
+    try:
+        coordinates = np.ndarray((2, coordinate_count), dtype=np.float64, buffer=shared_memory.buf)
+        cell_indices = construct_params.find_indices(coordinates[0, start:stop], coordinates[1, start:stop])
+        del coordinates
+        cell_indices = cell_indices[-1 != cell_indices]
+        return np.unique(cell_indices, return_counts=True)
+    finally:
+        shared_memory.close()
+
+
+
+def _equal_grids(grid, other_grid):
+    """
+    Returns True when both grids are the same object or are constructed using the same definition.
+    """
+    if (grid is other_grid):
+        return True
+
+    construct_params = getattr(grid, '_construct', None)
+    other_construct_params = getattr(other_grid, '_construct', None)
+    if (construct_params is None or other_construct_params is None):
+        return False
+
+    return construct_params.definition() == other_construct_params.definition()
+
+
+
+class spatial_grid_aggregator:
+    """
+    Represents an incremental aggregation of coordinate chunks using a spatial grid.
+    Only the occupied cells are kept in memory, so that arbitrary large inputs can be binned chunk by chunk.
+    """
+    def __init__(self, grid, wkid=None):
+        self._grid = grid
+        self._wkid = wkid if wkid else grid.wkid()
+        if (grid.wkid() != self._wkid):
+            raise ValueError('The WKID of the grid must match the WKID of the geometries!')
+
+        self._cell_indices = np.empty(0, dtype=np.int64)
+        self._hit_counts = np.empty(0, dtype=np.int64)
+
+    def grid(self):
+        """
+        Returns the spatial grid of this aggregator.
+        """
+        return self._grid
+
+    def update(self, x, y):
+        """
+        Bins the coordinate arrays and adds the hits to the already aggregated cells.
+        The coordinates must have the same spatial reference as the grid!
+        """
+        if (len(x) != len(y)):
+            raise ValueError("Coordinate arrays must have equal length!")
+
+        cell_indices = self._grid.find_indices(x, y)
+        cell_indices = cell_indices[-1 != cell_indices]
+        grid_indices, hit_counts = np.unique(cell_indices, return_counts=True)
+        self._add(grid_indices, hit_counts)
+        return self
+
+    def update_chunks(self, chunks, x_field='x', y_field='y'):
+        """
+        Bins every chunk of an iterator, e.g. the dataframes returned by pandas.read_csv using a chunksize.
+        """
+        for chunk in chunks:
+            self.update(chunk[x_field], chunk[y_field])
+
+        return self
+
+    def merge(self, other):
+        """
+        Adds the hits of another aggregator using an equal spatial grid.
+        The grids are equal when they have the same type, extent, cell size and wkid, e.g. a grid being loaded or unpickled.
+        """
+        if not _equal_grids(self._grid, other._grid):
+            raise ValueError('The aggregators must use the same spatial grid!')
+
+        self._add(other._cell_indices, other._hit_counts)
+        return self
+
+    def _add(self, cell_indices, hit_counts):
+        if (0 == len(cell_indices)):
+            return
+
+        if (0 == len(self._cell_indices)):
+            self._cell_indices = np.asarray(cell_indices, dtype=np.int64)
+            self._hit_counts = np.asarray(hit_counts, dtype=np.int64)
+            return
+
+        self._cell_indices, self._hit_counts = _reduce_hit_counts(
+            np.concatenate((self._cell_indices, cell_indices)),
+            np.concatenate((self._hit_counts, hit_counts))
+        )
+
+    def aggregation(self):
+        """
+        Returns the spatial grid aggregation of all the hits so far.
+        """
+        return spatial_grid_aggregation(self._grid, self._cell_indices.copy(), self._hit_counts.copy(), self._wkid)
+
+
+
+class spatial_grid_pyramid:
+    """
+    Represents aggregations of several zoom levels being derived from one aggregation of a rectangular grid.
+    The level 0 is the aggregation itself, every coarser level doubles the cell size using the same extent
+    and sums up the hit counts of the 2x2 child cells.
+    """
+    def __init__(self, aggregation, level_count):
+        if (level_count < 1):
+            raise ValueError('At least one level is required!')
+
+        grid = aggregation.grid()
+        construct_params = getattr(grid, '_construct', None)
+        if not isinstance(construct_params, rectangular_construct_params):
+            raise ValueError('Only aggregations of rectangular grids can be rolled up!')
+
+        self._levels = [aggregation]
+        rows, columns = construct_params.rows_and_columns(aggregation.cell_indices())
+        hit_counts = aggregation.columns(rows_and_columns=False, centers=False)['hitCount']
+        for level in range(1, level_count):
+            construct_params = rectangular_construct_params(construct_params._extent, 2.0 * construct_params._cell_size)
+            level_grid = rectangular_spatial_grid.build_from_params(construct_params, grid.is_lazy())
+            rows = rows // 2
+            columns = columns // 2
+            grid_indices, hit_counts = _reduce_hit_counts(rows + (construct_params.rows() * columns), hit_counts)
+            rows, columns = construct_params.rows_and_columns(grid_indices)
+            self._levels.append(spatial_grid_aggregation(level_grid, grid_indices, hit_counts, aggregation.wkid()))
+
+    def __len__(self):
+        return len(self._levels)
+
+    def level(self, level):
+        """
+        Returns the aggregation of the specified level, the level 0 has the finest spacing.
+        """
+        return self._levels[level]
+
+    def levels(self):
+        """
+        Returns the aggregations of all levels starting with the finest spacing.
+        """
+        return list(self._levels)
+
+
+
+# Monday, so that weekly time buckets start at midnight of every monday
+TIME_BUCKET_ORIGIN = np.datetime64('1970-01-05T00:00:00', 'ns')
+
+class space_time_cube:
+    """
+    Represents a sparse cube of hit counts for every occupied combination of grid cell and time bucket.
+    The time bucket index counts the buckets of the specified size since the origin.
+    The entries are sorted by time bucket and cell index, so that every time step is a contiguous slice.
+    """
+    def __init__(self, grid, cell_indices, bucket_indices, hit_counts, wkid, bucket_size, origin=TIME_BUCKET_ORIGIN):
+        self._grid = grid
+        self._cell_indices = np.asanyarray(cell_indices, dtype=np.int64)
+        self._bucket_indices = np.asanyarray(bucket_indices, dtype=np.int64)
+        self._hit_counts = np.asanyarray(hit_counts, dtype=np.int64)
+        if (len(self._cell_indices) != len(self._bucket_indices) or len(self._cell_indices) != len(self._hit_counts)):
+            raise ValueError('The cell indices, bucket indices and hit counts must have equal length!')
+
+        self._wkid = wkid
+        self._bucket_size = np.timedelta64(bucket_size, 'ns')
+        self._origin = np.datetime64(origin, 'ns')
+
+    def grid(self):
+        return self._grid
+
+    def wkid(self):
+        return self._wkid
+
+    def bucket_size(self):
+        return self._bucket_size
+
+    def __len__(self):
+        return len(self._cell_indices)
+
+    def time_steps(self):
+        """
+        Returns the sorted indices of all occupied time buckets.
+        """
+        return np.unique(self._bucket_indices)
+
+    def bucket_start(self, bucket_index):
+        """
+        Returns the start of the specified time bucket as numpy datetime.
+        """
+        return self._origin + np.int64(bucket_index) * self._bucket_size
+
+    def bucket_index(self, timestamp):
+        """
+        Returns the index of the time bucket containing the specified timestamp.
+        """
+        return int((np.datetime64(timestamp, 'ns') - self._origin) // self._bucket_size)
+
+    def time_slice(self, bucket_index):
+        """
+        Returns the aggregation of the specified time bucket.
+        """
+        start = np.searchsorted(self._bucket_indices, bucket_index, side='left')
+        stop = np.searchsorted(self._bucket_indices, bucket_index, side='right')
+        return spatial_grid_aggregation(self._grid, self._cell_indices[start:stop], self._hit_counts[start:stop], self._wkid)
+
+    def time_slices(self):
+        """
+        Returns a list of tuples containing the start of every occupied time bucket and its aggregation.
+        """
+        return [(self.bucket_start(bucket_index), self.time_slice(bucket_index)) for bucket_index in self.time_steps().tolist()]
+
+    def columns(self):
+        """
+        Returns a dictionary of the parallel arrays 'cellIndex', 'bucketIndex', 'bucketStart' and 'hitCount'.
+        """
+        return {
+            'cellIndex': self._cell_indices,
+            'bucketIndex': self._bucket_indices,
+            'bucketStart': self._origin + self._bucket_indices * self._bucket_size,
+            'hitCount': self._hit_counts
+        }
+
+    def to_dataframe(self):
+        """
+        Returns the cube as a pandas dataframe having one row for every occupied cell and time bucket.
+        """
+        import pandas as pd
+        return pd.DataFrame(self.columns(), copy=False)
+
+
+
+class geospatial_engine:
+    """
+    Represents a geospatial engine offering geospatial operations.
+    """
+
+    def create_points(self, latitudes, longitudes):
+        """
+        Creates a list of points using the latitude and longitude arrays.
+        """
+        if (len(latitudes) != len(longitudes)):
+            raise ValueError("Coordinate arrays must have equal length!")
+
+        return [Point({
+            'x': longitude,
+            'y': latitude
+        }) for (longitude, latitude) in zip(longitudes, latitudes)]
+
+    def create_spatial_grid(self, spacing_meters, lazy=False):
+        """
+        Create a spatial grid with the defined grid cell size in meters.
+        A lazy grid constructs the cells on demand and does not hold any cells in memory.
+        """
+        raise NotImplementedError
+
+    def create_hexagonal_spatial_grid(self, spacing_meters, lazy=False):
+        """
+        Create a hexagonal spatial grid using Web Mercator with the defined distance between cell center and vertex in meters.
+        The grid is created locally and a lazy grid constructs the cells on demand.
+        """
+        construct_params = hexagonal_construct_params(self._create_web_mercator_extent(), spacing_meters)
+        return hexagonal_spatial_grid.build_from_params(construct_params, lazy)
+
+    def _create_web_mercator_extent(self):
+        # The Web Mercator extent is a square with latitudes between -85.05112878 and 85.05112878
+        x, y = self._project_coordinates_from_wgs84_to_web_mercator([-180.0, 180.0], [-90.0, 90.0])
+        return grid_cell(float(x[0]), float(y[0]), float(x[1]), float(y[1]), WEB_MERCATOR)
+
     def aggregate(self, grid, geometries, wkid):
+        """
+        Returns the aggregation between grid cells which intersects the specified list of geometries.
+        The hit count of a cell is the number of geometries intersecting with it.
+        """
         if (0 == len(geometries)):
-            return spatial_grid_aggregation(dict(), wkid)
+            return spatial_grid_aggregation.empty(grid, wkid)
 
         if (grid.wkid() != wkid):
             raise ValueError('The WKID of the grid must match the WKID of the geometries!')
 
         # Special cases (only points with grid aggregation)
-        #"""
-        first_geometry = geometries[0]
-        if ('Point' == first_geometry.type):
+        if all('Point' == geometry.type for geometry in geometries):
             return self._aggregate_points(grid, geometries, wkid)
-        #"""
 
-        max_geometry_count = 1000
-        if (max_geometry_count < len(geometries)):
-            raise ValueError('Not more than {} geometries are supported with this implementation!'.format(max_geometry_count))
+        return self._aggregate_geometries(grid, geometries, wkid)
 
-        # Create valid Esri polygons using rings
-        cell_polygons = []
-        for cell_rings in grid.cells_as_rings():
-            cell_polygon = Polygon({
-                'rings': cell_rings
-            })
-            cell_polygons.append(cell_polygon)
+    def project(self, geometries, in_sr, out_sr):
+        """
+        Projects the list of geometries from in_sr into out_sr.
+        """
+        raise NotImplementedError
 
-        # The aggregated bins
-        bins = dict()
-        
-        related_result = ago_relation(cell_polygons, geometries, spatial_ref=wkid, spatial_relation='esriGeometryRelationIntersection', gis=self._gis)
-        if not ('relations' in related_result):
+    def project_coordinates(self, x, y, in_sr, out_sr):
+        """
+        Projects the coordinate arrays from in_sr into out_sr and returns the projected x and y arrays.
+        The spatial references can be well-known ids as integer or string, dictionaries or SpatialReference instances.
+        WGS84 and Web Mercator are projected in both directions using numpy, the latitudes are clamped at the poles.
+        """
+        if (len(x) != len(y)):
+            raise ValueError("Coordinate arrays must have equal length!")
+
+        in_wkid = as_wkid(in_sr)
+        out_wkid = as_wkid(out_sr)
+        if (in_wkid == out_wkid):
+            return np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        if (WGS84 == in_wkid and WEB_MERCATOR == out_wkid):
+            return self._project_coordinates_from_wgs84_to_web_mercator(x, y)
+        if (WEB_MERCATOR == in_wkid and WGS84 == out_wkid):
+            return self._project_coordinates_from_web_mercator_to_wgs84(x, y)
+
+        points = self.create_points(y, x)
+        projected_points = self.project(points, in_sr, out_sr)
+        return (
+            np.fromiter((projected_point.x for projected_point in projected_points), dtype=np.float64, count=len(projected_points)),
+            np.fromiter((projected_point.y for projected_point in projected_points), dtype=np.float64, count=len(projected_points))
+        )
+
+    def _project_coordinates_from_wgs84_to_web_mercator(self, longitudes, latitudes):
+        major_axis = 6378137
+        major_shift = pi * major_axis
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        latitudes = np.clip(np.asarray(latitudes, dtype=np.float64), -WEB_MERCATOR_MAX_LATITUDE, WEB_MERCATOR_MAX_LATITUDE)
+        x = longitudes * major_shift / 180.0
+        y = (np.log(np.tan((90.0 + latitudes) * pi / 360.0)) / (pi / 180.0)) * major_shift / 180.0
+        return x, y
+
+    def _project_coordinates_from_web_mercator_to_wgs84(self, x, y):
+        major_axis = 6378137
+        major_shift = pi * major_axis
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        longitudes = x * 180.0 / major_shift
+        latitudes = (360.0 / pi) * np.arctan(np.exp(y * pi / major_shift)) - 90.0
+        return longitudes, latitudes
+
+    def _project_web_mercator_geometries(self, geometries, in_sr, out_sr):
+        """
+        Projects the geometries between WGS84 and Web Mercator without any network I/O.
+        Returns None when the spatial references are not supported.
+        """
+        in_wkid = as_wkid(in_sr)
+        out_wkid = as_wkid(out_sr)
+        if (WGS84 == in_wkid and WEB_MERCATOR == out_wkid):
+            projection = self._project_coordinates_from_wgs84_to_web_mercator
+        elif (WEB_MERCATOR == in_wkid and WGS84 == out_wkid):
+            projection = self._project_coordinates_from_web_mercator_to_wgs84
+        else:
             return None
 
-        for relation in related_result['relations']:
-            grid_index = relation['geometry1Index']
-            if not (grid_index in bins):
-                bins[grid_index] = {
-                    'geometry': cell_polygons[grid_index],
-                    'hitCount': 1
-                }
-            else:
-                bin_entry = bins[grid_index]
-                bin_entry['hitCount'] += 1
+        spatial_reference = {'wkid': out_wkid}
+        if all('Point' == geometry.type for geometry in geometries):
+            x, y = projection([point.x for point in geometries], [point.y for point in geometries])
+            return [Point({
+                'x': projected_x,
+                'y': projected_y,
+                'spatialReference': spatial_reference
+            }) for (projected_x, projected_y) in zip(x.tolist(), y.tolist())]
+
+        return [self._project_geometry(geometry, projection, spatial_reference) for geometry in geometries]
+
+    def _project_geometry(self, geometry, projection, spatial_reference):
+        geometry_type = geometry.type
+        if ('Point' == geometry_type):
+            x, y = projection([geometry.x], [geometry.y])
+            return Point({
+                'x': float(x[0]),
+                'y': float(y[0]),
+                'spatialReference': spatial_reference
+            })
         
-        return spatial_grid_aggregation(bins, wkid)
+        if ('Envelope' == geometry_type):
+            x, y = projection([geometry.xmin, geometry.xmax], [geometry.ymin, geometry.ymax])
+            return Envelope({
+                'xmin': float(x[0]),
+                'ymin': float(y[0]),
+                'xmax': float(x[1]),
+                'ymax': float(y[1]),
+                'spatialReference': spatial_reference
+            })
 
-    def _aggregate_points(self, grid, points, wkid):
-        # Create valid Esri polygons using rings
-        cell_polygons = []
-        for cell_rings in grid.cells_as_rings():
-            cell_polygon = Polygon({
-                'rings': cell_rings
+        def project_path(path):
+            coordinates = np.asarray(path, dtype=np.float64)
+            x, y = projection(coordinates[:, 0], coordinates[:, 1])
+            return np.column_stack((x, y)).tolist()
+
+        if ('Multipoint' == geometry_type):
+            return MultiPoint({
+                'points': project_path(geometry['points']),
+                'spatialReference': spatial_reference
+            })
+
+        if ('Polyline' == geometry_type):
+            return Polyline({
+                'paths': [project_path(path) for path in geometry['paths']],
+                'spatialReference': spatial_reference
             })
-            cell_polygons.append(cell_polygon)
 
-        # The aggregated bins
-        bins = dict()
+        if ('Polygon' == geometry_type):
+            return Polygon({
+                'rings': [project_path(ring) for ring in geometry['rings']],
+                'spatialReference': spatial_reference
+            })
+
+        raise ValueError('Geometries of type {} cannot be projected!'.format(geometry_type))
+
+    def aggregate_coordinates(self, grid, x, y, wkid, workers=None, chunk_size=None, point_index=False, values=None, statistics=None):
+        """
+        Returns the aggregation between grid cells and the specified coordinate arrays.
+        All coordinates are binned at once without creating any point geometries.
+        When more than one worker is specified, the coordinates are binned in chunks using a process pool.
+        The point index maps every occupied cell to the positions of the coordinates.
+        The values are a dictionary or dataframe of columns being parallel to the coordinates.
+        The statistics 'sum', 'mean', 'min', 'max' and 'count_distinct' are computed for every value column in the same pass.
+        The point index and the values are always binned by a single process and cannot be combined with more than one worker.
+        """
+        if (len(x) != len(y)):
+            raise ValueError("Coordinate arrays must have equal length!")
 
+        if (grid.wkid() != wkid):
+            raise ValueError('The WKID of the grid must match the WKID of the geometries!')
+
+        if (chunk_size is not None and chunk_size < 1):
+            raise ValueError('The chunk size must be greater than zero!')
+
+        if (point_index or values is not None):
+            if (workers and 1 < workers):
+                raise ValueError('The point index and the values cannot be binned using more than one worker!')
+            return self._aggregate_coordinates_indexed(grid, x, y, wkid, point_index, values, statistics)
+
+        if (workers and 1 < workers and 0 < len(x) and getattr(grid, '_construct', None)):
+            return self._aggregate_coordinates_parallel(grid, x, y, wkid, workers, chunk_size)
+
+        cell_indices = grid.find_indices(x, y)
+        cell_indices = cell_indices[-1 != cell_indices]
+        grid_indices, hit_counts = np.unique(cell_indices, return_counts=True)
+        return spatial_grid_aggregation(grid, grid_indices, hit_counts, wkid)
+
+    def aggregate_space_time(self, grid, x, y, timestamps, wkid, bucket_size, origin=TIME_BUCKET_ORIGIN):
+        """
+        Returns the space time cube between grid cells and time buckets for the specified coordinate and timestamp arrays.
+        The timestamps can be anything numpy converts to datetimes, the bucket size is a timedelta like one day or one week.
+        Coordinates outside of the grid and missing timestamps are ignored.
+        """
+        if (len(x) != len(y) or len(x) != len(timestamps)):
+            raise ValueError("Coordinate and timestamp arrays must have equal length!")
+
+        if (grid.wkid() != wkid):
+            raise ValueError('The WKID of the grid must match the WKID of the geometries!')
+
+        bucket_size = np.timedelta64(bucket_size, 'ns')
+        if (bucket_size <= np.timedelta64(0, 'ns')):
+            raise ValueError('The bucket size must be positive!')
+
+        timestamps = np.asarray(timestamps, dtype='datetime64[ns]')
+        cell_indices = grid.find_indices(x, y)
+        valid = (-1 != cell_indices) & ~np.isnat(timestamps)
+        bucket_indices = (timestamps[valid] - np.datetime64(origin, 'ns')) // bucket_size
+        cell_count = np.int64(len(grid.cells()))
+        cube_keys, hit_counts = np.unique(bucket_indices.astype(np.int64) * cell_count + cell_indices[valid], return_counts=True)
+        bucket_indices, cell_indices = np.divmod(cube_keys, cell_count)
+        return space_time_cube(grid, cell_indices, bucket_indices, hit_counts, wkid, bucket_size, origin)
+
+    def _aggregate_coordinates_indexed(self, grid, x, y, wkid, point_index=True, values=None, statistics=None):
+        """
+        Bins the coordinates and keeps the mapping between every location and its occupied cell.
+        The positions sorted by the cell index are the point index, so that every cell owns a slice of positions.
+        """
+        cell_indices = grid.find_indices(x, y)
+        positions = np.flatnonzero(-1 != cell_indices)
+        grid_indices, inverse_indices, hit_counts = np.unique(cell_indices[positions], return_inverse=True, return_counts=True)
+
+        point_offsets = None
+        point_positions = None
+        if point_index:
+            point_offsets = np.zeros(len(hit_counts) + 1, dtype=np.int64)
+            np.cumsum(hit_counts, out=point_offsets[1:])
+            point_positions = positions[np.argsort(inverse_indices, kind='stable')]
+
+        results = None
+        if values is not None:
+            value_columns = values if isinstance(values, dict) else { value_name: values[value_name] for value_name in values.columns }
+            value_columns = { value_name: np.asarray(value_column)[positions] for (value_name, value_column) in value_columns.items() }
+            results = _reduce_statistics(inverse_indices, hit_counts, value_columns, statistics if statistics else ['sum'])
+
+        return spatial_grid_aggregation(grid, grid_indices, hit_counts, wkid, point_offsets, point_positions, results)
+
+    def _aggregate_coordinates_parallel(self, grid, x, y, wkid, workers, chunk_size=None):
+        """
+        Bins the coordinates using a process pool.
+        The workers read the coordinates from shared memory and return the partial hit counts of their chunk.
+        """
+        coordinate_count = len(x)
+        if not chunk_size:
+            chunk_size = int(ceil(coordinate_count / workers))
+        
+        shared_memory = SharedMemory(create=True, size=2 * coordinate_count * np.dtype(np.float64).itemsize)
+        try:
+            coordinates = np.ndarray((2, coordinate_count), dtype=np.float64, buffer=shared_memory.buf)
+            coordinates[0] = np.asarray(x, dtype=np.float64)
+            coordinates[1] = np.asarray(y, dtype=np.float64)
+            del coordinates
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_bin_shared_coordinates, grid._construct, shared_memory.name, coordinate_count, start, min(start + chunk_size, coordinate_count)) 
+                           for start in range(0, coordinate_count, chunk_size)]
+                partial_results = [future.result() for future in futures]
+        finally:
+            shared_memory.close()
+            shared_memory.unlink()
+
+        grid_indices, hit_counts = _reduce_hit_counts(
+            np.concatenate([partial_indices for (partial_indices, _) in partial_results]),
+            np.concatenate([partial_counts for (_, partial_counts) in partial_results])
+        )
+        return spatial_grid_aggregation(grid, grid_indices, hit_counts, wkid)
+
+    def _aggregate_geometries(self, grid, geometries, wkid):
+        """
+        Aggregates points, multipoints, polylines, polygons and envelopes without any network I/O.
+        Only the cells within the bounding box of every segment are tested against the exact segment.
+        The cells within the bounding box of a polygon are tested whether their centers are inside the rings.
+        """
+        construct_params = getattr(grid, '_construct', None)
+        if not construct_params:
+            raise ValueError('Only grids being built from construction params can aggregate geometries!')
+
+        owner_arrays = []
+        cell_index_arrays = []
+        point_owners = []
+        point_coordinates = []
+        segment_owners = []
+        segment_arrays = []
+        for (geometry_index, geometry) in enumerate(geometries):
+            geometry_type = geometry.type
+            if ('Point' == geometry_type):
+                point_owners.append(geometry_index)
+                point_coordinates.append([geometry.x, geometry.y])
+            elif ('Multipoint' == geometry_type):
+                for point in geometry['points']:
+                    point_owners.append(geometry_index)
+                    point_coordinates.append(point[:2])
+            elif ('Polyline' == geometry_type):
+                for path in geometry['paths']:
+                    path_segments = _path_segments(path)
+                    segment_owners.append(np.full(len(path_segments), geometry_index, dtype=np.int64))
+                    segment_arrays.append(path_segments)
+            elif ('Polygon' == geometry_type or 'Envelope' == geometry_type):
+                if ('Envelope' == geometry_type):
+                    rings = [[[geometry.xmin, geometry.ymin], [geometry.xmin, geometry.ymax], [geometry.xmax, geometry.ymax], [geometry.xmax, geometry.ymin], [geometry.xmin, geometry.ymin]]]
+                else:
+                    rings = geometry['rings']
+
+                # Rings having less than two vertices do not have any segments
+                ring_segments = [segments for segments in (_path_segments(ring) for ring in rings) if (0 < len(segments))]
+                if (0 == len(ring_segments)):
+                    continue
+
+                polygon_segments = np.concatenate(ring_segments)
+                segment_owners.append(np.full(len(polygon_segments), geometry_index, dtype=np.int64))
+                segment_arrays.append(polygon_segments)
+
+                # Cells being completely inside of the polygon
+                polygon_xmin, polygon_ymin = polygon_segments.min(axis=(0, 1))
+                polygon_xmax, polygon_ymax = polygon_segments.max(axis=(0, 1))
+                _, interior_indices = _candidate_cells(construct_params, [polygon_xmin], [polygon_ymin], [polygon_xmax], [polygon_ymax])
+                center_x, center_y = construct_params.centers(interior_indices)
+                interior_indices = interior_indices[_points_in_rings(center_x, center_y, polygon_segments)]
+                owner_arrays.append(np.full(len(interior_indices), geometry_index, dtype=np.int64))
+                cell_index_arrays.append(interior_indices)
+            else:
+                raise ValueError('Geometries of type {} cannot be aggregated!'.format(geometry_type))
+
+        if (0 < len(point_owners)):
+            point_coordinates = np.asarray(point_coordinates, dtype=np.float64)
+            point_indices = construct_params.find_indices(point_coordinates[:, 0], point_coordinates[:, 1])
+            hits = -1 != point_indices
+            owner_arrays.append(np.asarray(point_owners, dtype=np.int64)[hits])
+            cell_index_arrays.append(point_indices[hits])
+
+        if (0 < len(segment_arrays)):
+            # Short segments keep the number of candidate cells small
+            split_owners, segments = _split_segments(np.concatenate(segment_arrays), construct_params._cell_size)
+            segment_owners = np.concatenate(segment_owners)[split_owners]
+            chunk_size = 1 << 20
+            for start in range(0, len(segments), chunk_size):
+                chunk_segments = segments[start: start + chunk_size]
+                candidate_segments, candidate_indices = _candidate_cells(construct_params,
+                    chunk_segments[:, :, 0].min(axis=1), chunk_segments[:, :, 1].min(axis=1),
+                    chunk_segments[:, :, 0].max(axis=1), chunk_segments[:, :, 1].max(axis=1))
+                hits = _segments_intersect_cells(construct_params, chunk_segments[candidate_segments], candidate_indices)
+                owner_arrays.append(segment_owners[start: start + chunk_size][candidate_segments[hits]])
+                cell_index_arrays.append(candidate_indices[hits])
+
+        if (0 == len(owner_arrays)):
+            return spatial_grid_aggregation.empty(grid, wkid)
+
+        # Every geometry counts only once per cell
+        cell_count = construct_params.cell_count()
+        relation_keys = np.unique(np.concatenate(owner_arrays) * cell_count + np.concatenate(cell_index_arrays))
+        grid_indices, hit_counts = np.unique(relation_keys % cell_count, return_counts=True)
+        return spatial_grid_aggregation(grid, grid_indices, hit_counts, wkid)
+
+    def _aggregate_points(self, grid, points, wkid):
         for point in points:
             if ('Point' != point.type):
                 raise ValueError('Only points can be aggregated with this implementation!')
 
-            x = point.x
-            y = point.y
-            grid_index = grid.find_index(x, y)
-            if -1 != grid_index:
-                if not (grid_index in bins):
-                    bins[grid_index] = {
-                        'geometry': cell_polygons[grid_index],
-                        'hitCount': 1
-                    }
-                else:
-                    bin_entry = bins[grid_index]
-                    bin_entry['hitCount'] += 1
+        x = np.fromiter((point.x for point in points), dtype=np.float64, count=len(points))
+        y = np.fromiter((point.y for point in points), dtype=np.float64, count=len(points))
+        return self.aggregate_coordinates(grid, x, y, wkid)
 
-        return spatial_grid_aggregation(bins, wkid)
+
+
+def _is_transient_error(error):
+    """
+    Returns True for connection errors, timeouts and the HTTP status codes 429 and 5xx.
+    The ArcGIS API raises service errors as plain exceptions ending with '(Error Code: 503)'.
+    """
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, ConnectionError, TimeoutError)):
+        return True
+
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code in TRANSIENT_STATUS_CODES
+
+    error_code = re.search(r'\(Error Code: (\d+)\)', str(error))
+    return error_code is not None and int(error_code.group(1)) in TRANSIENT_STATUS_CODES
+
+
+
+class ago_geospatial_engine(geospatial_engine):
+    """
+    Represents a geospatial engine using ArcGIS Online.
+    The GIS instance is only created when the project service is called, WGS84 and Web Mercator are projected locally.
+    Geometries are projected in chunks using a bounded thread pool sharing the session of the GIS instance.
+    Every chunk failing with a connection error, a timeout, 429 or 5xx is retried with an exponential backoff.
+    """
+    def __init__(self, chunk_size=1000, max_workers=4, max_retries=3, backoff_factor=0.5):
+        super().__init__()
+        if (chunk_size < 1):
+            raise ValueError('The chunk size must be greater than zero!')
+        if (max_workers < 1):
+            raise ValueError('The number of workers must be greater than zero!')
+
+        self._gis = None
+        self._gis_lock = threading.Lock()
+        self._chunk_size = chunk_size
+        self._max_workers = max_workers
+        self._max_retries = max_retries
+        self._backoff_factor = backoff_factor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with self._gis_lock:
+            if self._gis is None:
+                return
+
+            if (self._gis._con and self._gis._con._session):
+                self._gis._con._session.close()
+
+            del self._gis
+            self._gis = None
+
+    def _connect(self):
+        """
+        Returns the GIS instance being created on the first call.
+        """
+        with self._gis_lock:
+            if self._gis is None:
+                self._gis = GIS()
+            return self._gis
+
+    def create_spatial_grid(self, spacing_meters, lazy=False):
+        # Use WGS84 and reproject to Web Mercator
+        envelope_wgs84 = Envelope({
+            'xmin': -180.0, 
+            'ymin': -90.0, 
+            'xmax': 180.0, 
+            'ymax': 90.0, 
+            'spatialReference': {'wkid': 4326}
+        })
+        input_geometries = [envelope_wgs84]
+        projected_geometries = self.project(input_geometries, in_sr='4326', out_sr='3857')
+        envelope_mercator = projected_geometries[0]
+
+        extent_cell = grid_cell(envelope_mercator.xmin, envelope_mercator.ymin, envelope_mercator.xmax, envelope_mercator.ymax, 3857)
+        construct_params = rectangular_construct_params(extent_cell, spacing_meters)
+        return rectangular_spatial_grid.build_from_params(construct_params, lazy)
+    
+    def project(self, geometries, in_sr, out_sr):
+        if (0 == len(geometries)):
+            return []
+
+        # Special cases (WGS84 and Web Mercator are projected locally)
+        projected_geometries = self._project_web_mercator_geometries(geometries, in_sr, out_sr)
+        if projected_geometries is not None:
+            return projected_geometries
+
+        if (len(geometries) <= self._chunk_size):
+            return self._project_chunk(geometries, in_sr, out_sr)
+
+        # Project the chunks concurrently, the executor returns the results in input order
+        geometries_chunked = [geometries[index: index + self._chunk_size] for index in range(0, len(geometries), self._chunk_size)]
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            projected_chunks = executor.map(lambda chunk: self._project_chunk(chunk, in_sr, out_sr), geometries_chunked)
+            return list(chain.from_iterable(projected_chunks))
+
+    def _project_chunk(self, geometries, in_sr, out_sr):
+        """
+        Projects one chunk using the project service and retries transient failures using an exponential backoff.
+        All other failures like an invalid spatial reference are raised immediately.
+        """
+        for attempt in range(0, self._max_retries + 1):
+            try:
+                return ago_project(geometries, in_sr, out_sr, gis=self._connect())
+            except Exception as error:
+                if (self._max_retries == attempt or not _is_transient_error(error)):
+                    raise
+
+                time.sleep(self._backoff_factor * (2 ** attempt))
+
+    def _project_points_from_wgs84_to_web_mercator(self, wgs84_points):
+        return self._project_web_mercator_geometries(wgs84_points, WGS84, WEB_MERCATOR)
+
+
+
+class local_geospatial_engine(geospatial_engine):
+    """
+    Represents a geospatial engine without any network I/O.
+    Only WGS84 and Web Mercator are supported as spatial references.
+    """
+    def __init__(self):
+        super().__init__()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def create_spatial_grid(self, spacing_meters, lazy=False):
+        construct_params = rectangular_construct_params(self._create_web_mercator_extent(), spacing_meters)
+        return rectangular_spatial_grid.build_from_params(construct_params, lazy)
+
+    def project(self, geometries, in_sr, out_sr):
+        if (0 == len(geometries)):
+            return []
+
+        if (as_wkid(in_sr) == as_wkid(out_sr)):
+            return list(geometries)
+
+        projected_geometries = self._project_web_mercator_geometries(geometries, in_sr, out_sr)
+        if projected_geometries is None:
+            raise ValueError('Only WGS84 and Web Mercator are supported by the local engine!')
+
+        return projected_geometries
 
 
 
@@ -430,9 +1866,18 @@ class geospatial_engine_factory:
     """
 
     @staticmethod
-    def create_cloud_engine():
+    def create_cloud_engine(chunk_size=1000, max_workers=4, max_retries=3, backoff_factor=0.5):
         """
         Creates a geospatial engine using ArcGIS Online.
-        You have to ensure using the with statement, otherwise the underlying GIS instance is not initialized correctly! 
+        Use the with statement, so that the session of the underlying GIS instance is closed.
+        The GIS instance is only created when a geometry must be projected by the project service.
+        The chunk size, the number of workers and the retries control the projection of many geometries.
+        """
+        return ago_geospatial_engine(chunk_size, max_workers, max_retries, backoff_factor)
+
+    @staticmethod
+    def create_local_engine():
+        """
+        Creates a geospatial engine which does not need any network connection.
         """
-        return ago_geospatial_engine()
\ No newline at end of file
+        return local_geospatial_engine()
\ No newline at end of file
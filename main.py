@@ -15,7 +15,16 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
+import gc
+import numpy
+import os
+import pandas
+import pickle
+import tempfile
+import threading
 import unittest
+import weakref
+from unittest import mock
 from geoint import *
 
 class TestSpatialBinning(unittest.TestCase):
@@ -103,5 +112,622 @@ class TestSpatialBinning(unittest.TestCase):
 
 
 
+class TestVectorizedBinning(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        extent = geospatial.grid_cell(-20037508.342789244, -20037508.342789244, 20037508.342789244, 20037508.342789244, 3857)
+        construct_params = geospatial.rectangular_construct_params(extent, 1e6)
+        cls._grid = geospatial.rectangular_spatial_grid.build_from_params(construct_params)
+
+    def test_find_indices(self):
+        random_generator = numpy.random.default_rng(42)
+        x = random_generator.uniform(-2.5e7, 2.5e7, 1000)
+        y = random_generator.uniform(-2.5e7, 2.5e7, 1000)
+        cell_indices = self._grid.find_indices(x, y)
+        expected_indices = [self._grid.find_index(x_coordinate, y_coordinate) for (x_coordinate, y_coordinate) in zip(x, y)]
+        self.assertListEqual(expected_indices, cell_indices.tolist(), 'The vectorized indices must match the scalar indices!')
+
+    def test_aggregate_coordinates(self):
+        cells = self._grid.cells()
+        x = pandas.Series([cell.center_x() for cell in cells] + [cells[0].center_x(), 3e7])
+        y = pandas.Series([cell.center_y() for cell in cells] + [cells[0].center_y(), 3e7])
+        geospatial_engine = geospatial.geospatial_engine_factory.create_cloud_engine()
+        aggregation = geospatial_engine.aggregate_coordinates(self._grid, x, y, self._grid.wkid())
+        bins = aggregation.bins()
+        self.assertEqual(len(cells), len(bins), 'The number of bins must match the number of cells!')
+        hit_counts = sorted(bin_entry['hitCount'] for bin_entry in bins)
+        self.assertEqual(2, hit_counts[-1], 'The first cell must have a hit count of 2!')
+        self.assertEqual(len(cells) + 1, sum(hit_counts), 'The points outside of the extent must be ignored!')
+
+    def test_occupied_cells_only(self):
+        geospatial_engine = geospatial.geospatial_engine_factory.create_local_engine()
+        aggregation = geospatial_engine.aggregate_coordinates(self._grid, [1.0, 2.0, 3e6], [1.0, 2.0, 3e6], self._grid.wkid())
+        hit_counts = aggregation.hit_counts()
+        self.assertEqual(2, len(hit_counts), 'Only the occupied cells must be stored!')
+        
+        cell_index = self._grid.find_index(1.0, 1.0)
+        self.assertEqual(2, hit_counts[cell_index], 'Hit count of 2 was expected!')
+
+        feature_set = aggregation.to_featureset()
+        self.assertEqual(2, len(feature_set.features), 'Two features were expected!')
+        rings = [feature.geometry['rings'] for feature in feature_set.features]
+        self.assertIn(self._grid.cells_as_rings()[cell_index], rings, 'The polygon of the occupied cell was expected!')
+
+    def test_columnar_aggregation(self):
+        cells = self._grid.cells()
+        x = [cell.center_x() for cell in cells[::7]]
+        y = [cell.center_y() for cell in cells[::7]]
+        geospatial_engine = geospatial.geospatial_engine_factory.create_local_engine()
+        aggregation = geospatial_engine.aggregate_coordinates(self._grid, x, y, self._grid.wkid())
+        columns = aggregation.columns()
+        self.assertListEqual(list(range(0, len(cells), 7)), columns['cellIndex'].tolist(), 'Every seventh cell was expected!')
+        numpy.testing.assert_allclose(x, columns['centerX'])
+        numpy.testing.assert_allclose(y, columns['centerY'])
+        expected_rows_and_columns = [divmod(cell_index, self._grid._construct.rows())[::-1] for cell_index in columns['cellIndex']]
+        self.assertListEqual(expected_rows_and_columns, list(zip(columns['row'].tolist(), columns['column'].tolist())), 'The rows and columns do not match!')
+
+        dataframe = aggregation.to_dataframe()
+        self.assertEqual(len(aggregation), len(dataframe), 'Every occupied cell must be a row!')
+        self.assertEqual(len(x), dataframe['hitCount'].sum(), 'Every location must be counted!')
+
+        table = aggregation.to_arrow(rows_and_columns=False)
+        self.assertListEqual(['cellIndex', 'hitCount', 'centerX', 'centerY'], table.column_names, 'The arrow columns do not match!')
+
+
+
+class TestIncrementalAggregation(unittest.TestCase):
+
+    def test_update_and_merge(self):
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            grid = geospatial_engine.create_spatial_grid(1e6, lazy=True)
+            random_generator = numpy.random.default_rng(7)
+            x = random_generator.uniform(-2e7, 2e7, 10000)
+            y = random_generator.uniform(-2e7, 2e7, 10000)
+            expected_counts = geospatial_engine.aggregate_coordinates(grid, x, y, grid.wkid()).hit_counts()
+
+            locations = pandas.DataFrame({'x': x, 'y': y})
+            chunks = (locations[index: index + 999] for index in range(0, 5994, 999))
+            aggregator = geospatial.spatial_grid_aggregator(grid).update_chunks(chunks)
+            other_aggregator = geospatial.spatial_grid_aggregator(grid).update(x[5994:], y[5994:])
+            aggregation = aggregator.merge(other_aggregator).aggregation()
+            self.assertDictEqual(expected_counts, aggregation.hit_counts(), 'The incremental aggregation must match the aggregation!')
+
+    def test_merge_equal_grids(self):
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            grid = geospatial_engine.create_spatial_grid(1e6, lazy=True)
+            with tempfile.TemporaryDirectory() as directory_path:
+                file_path = os.path.join(directory_path, 'grid.npz')
+                grid.save(file_path)
+                loaded_grid = geospatial.load_spatial_grid(file_path)
+
+            aggregator = geospatial.spatial_grid_aggregator(grid).update([1.0], [1.0])
+            other_aggregator = pickle.loads(pickle.dumps(geospatial.spatial_grid_aggregator(loaded_grid).update([2.0], [2.0])))
+            aggregation = aggregator.merge(other_aggregator).aggregation()
+            self.assertEqual([2], list(aggregation.hit_counts().values()), 'Aggregators of equal grids must be merged!')
+
+            other_grid = geospatial_engine.create_spatial_grid(2e6, lazy=True)
+            with self.assertRaises(ValueError):
+                aggregator.merge(geospatial.spatial_grid_aggregator(other_grid))
+            with self.assertRaises(ValueError):
+                aggregator.merge(geospatial.spatial_grid_aggregator(geospatial_engine.create_hexagonal_spatial_grid(1e6, lazy=True)))
+
+    def test_parallel_binning(self):
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            grid = geospatial_engine.create_spatial_grid(1e5, lazy=True)
+            random_generator = numpy.random.default_rng(11)
+            x = random_generator.uniform(-2.1e7, 2.1e7, 100000)
+            y = random_generator.normal(0.0, 5e6, 100000)
+            aggregation = geospatial_engine.aggregate_coordinates(grid, x, y, grid.wkid())
+            parallel_aggregation = geospatial_engine.aggregate_coordinates(grid, x, y, grid.wkid(), workers=3, chunk_size=7000)
+            numpy.testing.assert_array_equal(aggregation.cell_indices(), parallel_aggregation.cell_indices())
+            numpy.testing.assert_array_equal(aggregation.columns()['hitCount'], parallel_aggregation.columns()['hitCount'])
+
+    def test_invalid_parallel_arguments(self):
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            grid = geospatial_engine.create_spatial_grid(1e6, lazy=True)
+            x = [1.0, 2.0]
+            y = [1.0, 2.0]
+            for chunk_size in [0, -1]:
+                with self.assertRaises(ValueError):
+                    geospatial_engine.aggregate_coordinates(grid, x, y, grid.wkid(), workers=2, chunk_size=chunk_size)
+            with self.assertRaises(ValueError):
+                geospatial_engine.aggregate_coordinates(grid, x, y, grid.wkid(), workers=2, point_index=True)
+            with self.assertRaises(ValueError):
+                geospatial_engine.aggregate_coordinates(grid, x, y, grid.wkid(), workers=2, values={ 'value': [1, 2] })
+
+
+
+class TestPointIndex(unittest.TestCase):
+
+    def test_point_positions(self):
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            grid = geospatial_engine.create_spatial_grid(1e6, lazy=True)
+            random_generator = numpy.random.default_rng(17)
+            x = random_generator.uniform(-2.5e7, 2.5e7, 5000)
+            y = random_generator.uniform(-2.5e7, 2.5e7, 5000)
+            aggregation = geospatial_engine.aggregate_coordinates(grid, x, y, grid.wkid(), point_index=True)
+            self.assertTrue(aggregation.has_point_index(), 'The aggregation must have a point index!')
+
+            cell_indices = grid.find_indices(x, y)
+            for (cell_index, hit_count) in aggregation.hit_counts().items():
+                positions = aggregation.point_positions(cell_index)
+                self.assertEqual(hit_count, len(positions), 'Every hit must have a position!')
+                self.assertListEqual(numpy.flatnonzero(cell_index == cell_indices).tolist(), positions.tolist(), 'The positions do not match!')
+
+            self.assertEqual(0, len(aggregation.point_positions(-1)), 'Unknown cells must not have positions!')
+
+
+
+class TestStatistics(unittest.TestCase):
+
+    def test_weighted_statistics(self):
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            grid = geospatial_engine.create_spatial_grid(2e6, lazy=True)
+            random_generator = numpy.random.default_rng(19)
+            events = pandas.DataFrame({
+                'x': random_generator.uniform(-2.5e7, 2.5e7, 5000),
+                'y': random_generator.uniform(-2.5e7, 2.5e7, 5000),
+                'fatalities': random_generator.integers(0, 20, 5000),
+                'actor': random_generator.choice(['A', 'B', 'C', 'D'], 5000)
+            })
+            statistics = ['sum', 'mean', 'min', 'max', 'count_distinct']
+            aggregation = geospatial_engine.aggregate_coordinates(grid, events['x'], events['y'], grid.wkid(), values=events[['fatalities', 'actor']], statistics=['count_distinct'])
+            self.assertIn('actor_count_distinct', aggregation.statistics(), 'The count distinct statistic was expected!')
+
+            aggregation = geospatial_engine.aggregate_coordinates(grid, events['x'], events['y'], grid.wkid(), values={'fatalities': events['fatalities']}, statistics=statistics)
+            events['cellIndex'] = grid.find_indices(events['x'], events['y'])
+            expected = events[-1 != events['cellIndex']].groupby('cellIndex')['fatalities'].agg(['sum', 'mean', 'min', 'max', 'nunique'])
+            columns = aggregation.columns(rows_and_columns=False, centers=False)
+            numpy.testing.assert_array_equal(expected.index.values, columns['cellIndex'])
+            for (statistic, expected_statistic) in zip(statistics, ['sum', 'mean', 'min', 'max', 'nunique']):
+                numpy.testing.assert_allclose(expected[expected_statistic].values, columns['fatalities_{}'.format(statistic)])
+
+            feature_set = aggregation.to_featureset()
+            self.assertIn('fatalities_max', feature_set.features[0].attributes, 'The statistics must be feature attributes!')
+
+            with tempfile.TemporaryDirectory() as directory_path:
+                aggregation.save(directory_path)
+                loaded_aggregation = geospatial.spatial_grid_aggregation.load(directory_path)
+                numpy.testing.assert_array_equal(columns['fatalities_sum'], loaded_aggregation.statistics()['fatalities_sum'])
+
+    def test_missing_values(self):
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            grid = geospatial_engine.create_spatial_grid(2e6, lazy=True)
+            random_generator = numpy.random.default_rng(23)
+            events = pandas.DataFrame({
+                'x': random_generator.uniform(-2.5e7, 2.5e7, 5000),
+                'y': random_generator.uniform(-2.5e7, 2.5e7, 5000),
+                'fatalities': random_generator.integers(0, 20, 5000).astype(float),
+                'actor': random_generator.choice(['A', 'B', 'C', 'D'], 5000).astype(object)
+            })
+            events.loc[random_generator.random(5000) < 0.3, 'fatalities'] = numpy.nan
+            events.loc[random_generator.random(5000) < 0.2, 'actor'] = numpy.nan
+            events.loc[random_generator.random(5000) < 0.1, 'actor'] = None
+            # Every value of the first cell is missing
+            events.loc[0:3, ['x', 'y']] = 0.0
+            events.loc[0:3, 'fatalities'] = numpy.nan
+            events.loc[0:3, 'actor'] = None
+            events.loc[4:, 'x'] = events.loc[4:, 'x'].where(events.loc[4:, 'x'].abs() > 2e6, 3e6)
+
+            aggregation = geospatial_engine.aggregate_coordinates(grid, events['x'], events['y'], grid.wkid(), values=events[['fatalities']], statistics=['sum', 'mean', 'min', 'max'])
+            distinct_aggregation = geospatial_engine.aggregate_coordinates(grid, events['x'], events['y'], grid.wkid(), values=events[['actor']], statistics=['count_distinct'])
+            events['cellIndex'] = grid.find_indices(events['x'], events['y'])
+            grouped = events[-1 != events['cellIndex']].groupby('cellIndex')
+            expected = grouped['fatalities'].agg(['sum', 'mean', 'min', 'max'])
+            columns = aggregation.columns(rows_and_columns=False, centers=False)
+            numpy.testing.assert_array_equal(expected.index.values, columns['cellIndex'])
+            for statistic in ['sum', 'mean', 'min', 'max']:
+                numpy.testing.assert_allclose(expected[statistic].values, columns['fatalities_{}'.format(statistic)])
+            numpy.testing.assert_array_equal(grouped['actor'].nunique().values, distinct_aggregation.statistics()['actor_count_distinct'])
+            self.assertTrue(numpy.isnan(columns['fatalities_mean']).any(), 'A cell without any value must have a NaN mean!')
+
+
+
+class TestSpaceTimeCube(unittest.TestCase):
+
+    def test_weekly_cube(self):
+        grid = create_hexagonal_spatial_grid(5e5, lazy=True)
+        random_generator = numpy.random.default_rng(17)
+        latitudes = random_generator.uniform(-60.0, 60.0, 2000)
+        longitudes = random_generator.uniform(-180.0, 180.0, 2000)
+        timestamps = pandas.Timestamp('2021-03-01') + pandas.to_timedelta(random_generator.integers(0, 28 * 24, 2000), unit='h')
+        cube = create_space_time_bins(grid, latitudes, longitudes, timestamps, pandas.Timedelta(weeks=1))
+        self.assertEqual(2000, cube.columns()['hitCount'].sum(), 'Every event must be binned!')
+        self.assertEqual(4, len(cube.time_steps()), 'Four weekly time steps were expected!')
+        self.assertEqual(numpy.datetime64('2021-03-01'), cube.bucket_start(cube.time_steps()[0]), 'Weekly buckets must start on mondays!')
+
+        geospatial_engine = geospatial.geospatial_engine_factory.create_local_engine()
+        x, y = geospatial_engine.project_coordinates(longitudes, latitudes, 4326, 3857)
+        for (bucket_start, time_slice) in cube.time_slices():
+            in_bucket = (bucket_start <= timestamps) & (timestamps < bucket_start + numpy.timedelta64(7, 'D'))
+            expected_aggregation = geospatial_engine.aggregate_coordinates(grid, x[in_bucket], y[in_bucket], grid.wkid())
+            numpy.testing.assert_array_equal(expected_aggregation.cell_indices(), time_slice.cell_indices())
+            self.assertEqual(expected_aggregation.hit_counts(), time_slice.hit_counts(), 'The time slice must match the binning of its events!')
+
+
+
+class TestPersistence(unittest.TestCase):
+
+    def test_save_and_load(self):
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            grid = geospatial_engine.create_spatial_grid(1e5, lazy=True)
+            random_generator = numpy.random.default_rng(3)
+            x = random_generator.uniform(-2e7, 2e7, 1000)
+            y = random_generator.uniform(-2e7, 2e7, 1000)
+            aggregation = geospatial_engine.aggregate_coordinates(grid, x, y, grid.wkid())
+
+        with tempfile.TemporaryDirectory() as directory_path:
+            grid_path = os.path.join(directory_path, 'grid.npz')
+            grid.save(grid_path)
+            loaded_grid = geospatial.load_spatial_grid(grid_path)
+            self.assertTrue(loaded_grid.is_lazy(), 'The loaded grid must be lazy!')
+            self.assertEqual(len(grid.cells()), len(loaded_grid.cells()), 'The number of cells must match!')
+            self.assertListEqual(grid.find_indices(x, y).tolist(), loaded_grid.find_indices(x, y).tolist(), 'The cell indices must match!')
+
+            grid_path = os.path.join(directory_path, 'grid_without_suffix')
+            grid.save(grid_path)
+            self.assertTrue(os.path.exists(grid_path + '.npz'), 'The grid must be saved having the npz suffix!')
+            loaded_grid = geospatial.load_spatial_grid(grid_path)
+            self.assertEqual(len(grid.cells()), len(loaded_grid.cells()), 'The number of cells must match!')
+
+            aggregation_path = os.path.join(directory_path, 'aggregation')
+            aggregation.save(aggregation_path)
+            loaded_aggregation = geospatial.spatial_grid_aggregation.load(aggregation_path)
+            self.assertIsInstance(loaded_aggregation.cell_indices(), numpy.memmap, 'The cell indices must be memory-mapped!')
+            self.assertDictEqual(aggregation.hit_counts(), loaded_aggregation.hit_counts(), 'The hit counts must match!')
+            self.assertEqual(aggregation.wkid(), loaded_aggregation.wkid(), 'The spatial reference must match!')
+            del loaded_aggregation
+
+
+
+class TestHexagonalGrid(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._grid = create_hexagonal_spatial_grid(1e6)
+
+    def test_find_indices(self):
+        cells = self._grid.cells()
+        centers = numpy.array([[cell.center_x(), cell.center_y()] for cell in cells])
+        random_generator = numpy.random.default_rng(5)
+        x = random_generator.uniform(-2.0037e7, 2.0037e7, 2000)
+        y = random_generator.uniform(-2.0037e7, 2.0037e7, 2000)
+        cell_indices = self._grid.find_indices(x, y)
+        for (cell_index, x_coordinate, y_coordinate) in zip(cell_indices, x, y):
+            distances = numpy.hypot(centers[:, 0] - x_coordinate, centers[:, 1] - y_coordinate)
+            self.assertAlmostEqual(distances.min(), distances[cell_index], places=6, msg='The nearest hexagon was expected!')
+            self.assertTrue(cells[cell_index].intersects(x_coordinate, y_coordinate), 'The hexagon must contain the location!')
+            self.assertEqual(cell_index, self._grid.find_index(x_coordinate, y_coordinate), 'The scalar index must match!')
+
+        self.assertEqual(-1, self._grid.find_index(3e7, 0.0), 'Locations outside of the extent must not have a cell!')
+
+    def test_binning_all_cells(self):
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            center_x, center_y = self._grid.cell_centers(numpy.arange(len(self._grid.cells())))
+            inside = (numpy.abs(center_x) < 2.0037e7) & (numpy.abs(center_y) < 2.0037e7)
+            aggregation = geospatial_engine.aggregate_coordinates(self._grid, center_x[inside], center_y[inside], self._grid.wkid())
+            self.assertEqual(numpy.count_nonzero(inside), len(aggregation), 'Every center must create a bin!')
+            self.assertTrue(numpy.all(1 == aggregation.columns()['hitCount']), 'Every bin must have a hit count of 1!')
+            rings = self._grid.cells_as_rings()
+            self.assertEqual(7, len(rings[0][0]), 'A closed hexagon ring was expected!')
+
+
+
+class TestGeometryAggregation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            cls._grid = geospatial_engine.create_spatial_grid(1e5, lazy=True)
+
+    def test_aggregate_polylines(self):
+        x0, y0, x1, y1 = -1234567.8, 234567.8, 3456789.1, -2345678.9
+        polyline = geospatial.Polyline({'paths': [[[x0, y0], [x1, y1]]]})
+        geospatial_engine = geospatial.geospatial_engine_factory.create_local_engine()
+        aggregation = geospatial_engine.aggregate(self._grid, [polyline] * 1500, self._grid.wkid())
+        first_row, first_column = self._grid.cell_rows_and_columns(self._grid.find_indices([x0], [y0]))
+        last_row, last_column = self._grid.cell_rows_and_columns(self._grid.find_indices([x1], [y1]))
+        expected_count = 1 + abs(int(last_row[0] - first_row[0])) + abs(int(last_column[0] - first_column[0]))
+        self.assertEqual(expected_count, len(aggregation), 'Every crossed cell must be a bin!')
+        self.assertTrue(numpy.all(1500 == aggregation.columns()['hitCount']), 'Every polyline must be counted once!')
+
+        fractions = numpy.linspace(0.0, 1.0, 100000)
+        sampled_indices = set(self._grid.find_indices(x0 + fractions * (x1 - x0), y0 + fractions * (y1 - y0)).tolist())
+        self.assertTrue(sampled_indices.issubset(aggregation.hit_counts()), 'Every sampled cell must be a bin!')
+
+    def test_aggregate_polygons(self):
+        cell = self._grid.intersect(1.0, 1.0)
+        x0, y0 = cell._xmin, cell._ymin
+        xmin, ymin, xmax, ymax = x0 + 1.0, y0 + 1.0, x0 + 11e5 - 1.0, y0 + 6e5 - 1.0
+        polygon = geospatial.Polygon({'rings': [
+            [[xmin, ymin], [xmin, ymax], [xmax, ymax], [xmax, ymin], [xmin, ymin]],
+            [[x0 + 3e5 - 1.0, y0 + 3e5 - 1.0], [x0 + 5e5 + 1.0, y0 + 3e5 - 1.0], [x0 + 5e5 + 1.0, y0 + 5e5 + 1.0], [x0 + 3e5 - 1.0, y0 + 5e5 + 1.0], [x0 + 3e5 - 1.0, y0 + 3e5 - 1.0]]
+        ]})
+        multipoint = geospatial.MultiPoint({'points': [[x0 + 5e4, y0 + 5e4], [x0 + 6e4, y0 + 6e4], [-3e7, 0.0]]})
+        geospatial_engine = geospatial.geospatial_engine_factory.create_local_engine()
+        aggregation = geospatial_engine.aggregate(self._grid, [polygon, multipoint], self._grid.wkid())
+        self.assertEqual(11 * 6 - 4, len(aggregation), 'The cells of the hole must not be bins!')
+        hit_counts = aggregation.hit_counts()
+        self.assertEqual(2, hit_counts[self._grid.find_index(x0 + 5e4, y0 + 5e4)], 'The multipoint must be counted once!')
+        self.assertNotIn(self._grid.find_index(x0 + 4e5, y0 + 4e5), hit_counts, 'The hole must not be a bin!')
+
+    def test_aggregate_degenerated_polygons(self):
+        point = geospatial.Point({'x': 1.0, 'y': 1.0})
+        degenerated_polygon = geospatial.Polygon({'rings': [[[0.0, 0.0]]]})
+        geospatial_engine = geospatial.geospatial_engine_factory.create_local_engine()
+        aggregation = geospatial_engine.aggregate(self._grid, [degenerated_polygon, point], self._grid.wkid())
+        self.assertEqual({ self._grid.find_index(1.0, 1.0): 1 }, aggregation.hit_counts(), 'Rings without segments must be ignored!')
+
+    def test_aggregate_hexagons(self):
+        hexagonal_grid = create_hexagonal_spatial_grid(1e5, lazy=True)
+        rings = [[[-1e6, -1e6], [-1e6, 1e6], [1.5e6, 2e5], [-1e6, -1e6]]]
+        polygon = geospatial.Polygon({'rings': rings})
+        geospatial_engine = geospatial.geospatial_engine_factory.create_local_engine()
+        aggregation = geospatial_engine.aggregate(hexagonal_grid, [polygon], hexagonal_grid.wkid())
+        random_generator = numpy.random.default_rng(9)
+        x = random_generator.uniform(-1e6, 1.5e6, 100000)
+        y = random_generator.uniform(-1e6, 1e6, 100000)
+        segments = numpy.array([[rings[0][index], rings[0][index + 1]] for index in range(3)], dtype=float)
+        inside = geospatial._points_in_rings(x, y, segments)
+        sampled_indices = set(hexagonal_grid.find_indices(x[inside], y[inside]).tolist())
+        self.assertTrue(sampled_indices.issubset(aggregation.hit_counts()), 'Every sampled cell must be a bin!')
+        self.assertLess(len(aggregation) - len(sampled_indices), 0.2 * len(sampled_indices), 'Only border cells may be missed by sampling!')
+
+
+
+class TestPyramid(unittest.TestCase):
+
+    def test_roll_up_levels(self):
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            random_generator = numpy.random.default_rng(13)
+            x = random_generator.normal(1e6, 3e6, 50000)
+            y = random_generator.normal(5e6, 2e6, 50000)
+            fine_grid = geospatial_engine.create_spatial_grid(1e4, lazy=True)
+            pyramid = geospatial.spatial_grid_pyramid(geospatial_engine.aggregate_coordinates(fine_grid, x, y, fine_grid.wkid()), 8)
+            self.assertEqual(8, len(pyramid), 'Eight levels were expected!')
+            for level in range(0, 8):
+                level_aggregation = pyramid.level(level)
+                level_grid = level_aggregation.grid()
+                self.assertEqual(1e4 * 2 ** level, level_grid._construct._cell_size, 'The cell size must double on every level!')
+                expected_aggregation = geospatial_engine.aggregate_coordinates(level_grid, x, y, level_grid.wkid())
+                self.assertDictEqual(expected_aggregation.hit_counts(), level_aggregation.hit_counts(), 'The rolled up counts must match the binning!')
+
+
+
+class TestGridCache(unittest.TestCase):
+
+    def test_memory_cache(self):
+        grid_cache = geospatial.spatial_grid_cache(max_size=2)
+        create_calls = []
+        def create_grid(spacing_meters):
+            create_calls.append(spacing_meters)
+            with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+                return geospatial_engine.create_spatial_grid(spacing_meters, lazy=True)
+
+        extent = (-180.0, -90.0, 180.0, 90.0)
+        first_grid = grid_cache.get_or_create('rectangular', 1e6, extent, 3857, True, lambda: create_grid(1e6))
+        self.assertIs(first_grid, grid_cache.get_or_create('rectangular', 1e6, extent, '3857', True, lambda: create_grid(1e6)), 'The cached grid was expected!')
+        grid_cache.get_or_create('rectangular', 2e6, extent, 3857, True, lambda: create_grid(2e6))
+        grid_cache.get_or_create('rectangular', 1e6, extent, 3857, True, lambda: create_grid(1e6))
+        grid_cache.get_or_create('rectangular', 3e6, extent, 3857, True, lambda: create_grid(3e6))
+        self.assertEqual(2, len(grid_cache), 'The cache must not exceed its maximum size!')
+        grid_cache.get_or_create('rectangular', 2e6, extent, 3857, True, lambda: create_grid(2e6))
+        self.assertListEqual([1e6, 2e6, 3e6, 2e6], create_calls, 'The least recently used grid must be evicted!')
+
+    def test_disk_cache(self):
+        with tempfile.TemporaryDirectory() as directory_path:
+            extent = (-180.0, -90.0, 180.0, 90.0)
+            create_grid = lambda: create_hexagonal_spatial_grid(1e6, lazy=True)
+            grid = geospatial.spatial_grid_cache(directory=directory_path).get_or_create('hexagonal', 1e6, extent, 3857, True, create_grid)
+            loaded_grid = geospatial.spatial_grid_cache(directory=directory_path).get_or_create('hexagonal', 1e6, extent, 3857, True, None)
+            self.assertIsInstance(loaded_grid, geospatial.hexagonal_spatial_grid, 'A hexagonal grid was expected!')
+            self.assertEqual(len(grid.cells()), len(loaded_grid.cells()), 'The number of cells must match!')
+            self.assertListEqual([], [file_name for file_name in os.listdir(directory_path) if file_name.count('.') > 1], 'No temporary files must be left!')
+
+    def test_eager_grids_are_released(self):
+        grid_cache = geospatial.spatial_grid_cache()
+        extent = (-180.0, -90.0, 180.0, 90.0)
+        create_grid = lambda: geospatial.geospatial_engine_factory.create_local_engine().create_spatial_grid(1e6)
+        grid = grid_cache.get_or_create('rectangular', 1e6, extent, 3857, False, create_grid)
+        self.assertIs(grid, grid_cache.get_or_create('rectangular', 1e6, extent, 3857, False, None), 'The referenced eager grid was expected!')
+        self.assertEqual(1, len(grid_cache), 'The eager grid must be cached while it is referenced!')
+
+        grid_reference = weakref.ref(grid)
+        del grid
+        gc.collect()
+        self.assertIsNone(grid_reference(), 'The cache must not keep the cells of an eager grid alive!')
+        self.assertEqual(0, len(grid_cache), 'The released eager grid must be removed from the cache!')
+
+
+
+class TestOfflineHelpers(unittest.TestCase):
+
+    def test_no_gis_connection(self):
+        with mock.patch.object(geospatial, 'GIS', side_effect=AssertionError('The GIS must not be created!')):
+            grid_cache.clear()
+            grid = create_spatial_grid(10e6)
+            aggregation = create_bins(grid, [51.83864, 50.73438], [12.24555, 7.09549])
+            self.assertEqual([2], list(aggregation.hit_counts().values()), 'Both locations must be binned locally!')
+            with geospatial.geospatial_engine_factory.create_cloud_engine() as geospatial_engine:
+                points = geospatial_engine.project(geospatial_engine.create_points([51.83864], [12.24555]), 4326, 3857)
+                self.assertAlmostEqual(1363168.390483571, points[0].x, places=6)
+
+    def test_service_projection(self):
+        grid = geospatial.rectangular_spatial_grid.build_from_params(geospatial.rectangular_construct_params(geospatial.grid_cell(0.0, 0.0, 100.0, 100.0, 25832), 10.0), lazy=True)
+        projected_points = [geospatial.Point({ 'x': 15.0, 'y': 25.0 })]
+        reset_default_cloud_engine()
+        try:
+            with mock.patch.object(geospatial, 'GIS') as create_gis, mock.patch.object(geospatial, 'ago_project', return_value=projected_points) as project:
+                aggregation = create_bins(grid, [51.0], [12.0])
+                create_space_time_bins(grid, [51.0], [12.0], [pandas.Timestamp('2022-05-01')], pandas.Timedelta(days=1))
+                create_gis.assert_called_once()
+                self.assertEqual(2, project.call_count, 'Every call must use the project service!')
+        finally:
+            reset_default_cloud_engine()
+        self.assertEqual({ grid.find_index(15.0, 25.0): 1 }, aggregation.hit_counts(), 'The projected location must be binned!')
+
+    def test_installed_cloud_engine(self):
+        grid = geospatial.rectangular_spatial_grid.build_from_params(geospatial.rectangular_construct_params(geospatial.grid_cell(0.0, 0.0, 100.0, 100.0, 25832), 10.0), lazy=True)
+        cloud_engine = geospatial.geospatial_engine_factory.create_cloud_engine().__enter__()
+        reset_default_engine(cloud_engine)
+        try:
+            self.assertIs(cloud_engine, default_cloud_engine(), 'The installed cloud engine must be shared!')
+            with mock.patch.object(cloud_engine, 'project_coordinates', return_value=([15.0], [25.0])) as project:
+                create_bins(grid, [51.0], [12.0])
+                project.assert_called_once()
+        finally:
+            reset_default_engine()
+
+
+
+class TestDefaultEngine(unittest.TestCase):
+
+    def tearDown(self):
+        reset_default_engine()
+
+    def test_shared_engine(self):
+        reset_default_engine()
+        local_engine = default_engine()
+        self.assertIsInstance(local_engine, geospatial.local_geospatial_engine, 'The shared engine must not need any network connection!')
+        shared_engines = []
+        threads = [threading.Thread(target=lambda: shared_engines.append(default_engine())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all(local_engine is shared_engine for shared_engine in shared_engines), 'All threads must share the engine!')
+
+        grid_cache.clear()
+        with mock.patch.object(local_engine, 'create_hexagonal_spatial_grid', wraps=local_engine.create_hexagonal_spatial_grid) as create_grid:
+            grid = create_hexagonal_spatial_grid(1e6, lazy=True)
+            create_grid.assert_called_once()
+        aggregation = create_mercator_bins(grid, [0.0, 10.0], [0.0, 10.0])
+        self.assertEqual(2, sum(aggregation.hit_counts().values()), 'The shared engine must bin the coordinates!')
+
+        with mock.patch.object(local_engine, '__exit__') as exit_engine:
+            reset_default_engine()
+            exit_engine.assert_called_once()
+
+
+
+class TestLocalEngine(unittest.TestCase):
+
+    def test_create_spatial_grid(self):
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            grid = geospatial_engine.create_spatial_grid(10e6)
+            self.assertIsNotNone(grid, 'The grid must not be none!')
+            self.assertEqual(3857, grid.wkid(), 'The grid must use Web Mercator!')
+            self.assertEqual(25, len(grid.cells()), 'The grid must have 5x5 cells!')
+
+    def test_reproject_locations(self):
+        WGS84 = 4326
+        WEB_MERCATOR = 3857
+        latitudes = [51.83864, 50.73438]
+        longitudes = [12.24555, 7.09549]
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            points = geospatial_engine.create_points(latitudes, longitudes)
+            projected_points = geospatial_engine.project(points, WGS84, WEB_MERCATOR)
+            self.assertEqual(len(points), len(projected_points), 'The same number of points must be returned!')
+            self.assertAlmostEqual(6771001.917079877, projected_points[0].y, places=6)
+            self.assertAlmostEqual(1363168.390483571, projected_points[0].x, places=6)
+
+            wgs84_points = geospatial_engine.project(projected_points, WEB_MERCATOR, WGS84)
+            self.assertAlmostEqual(latitudes[1], wgs84_points[1].y, places=9)
+            self.assertAlmostEqual(longitudes[1], wgs84_points[1].x, places=9)
+
+    def test_project_coordinates(self):
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            longitudes = numpy.array([12.24555, 7.09549, -180.0, 180.0])
+            latitudes = numpy.array([51.83864, 50.73438, -90.0, 90.0])
+            x, y = geospatial_engine.project_coordinates(longitudes, latitudes, '4326', geospatial.SpatialReference({'wkid': 102100}))
+            self.assertAlmostEqual(6771001.917079877, y[0], places=6)
+            self.assertAlmostEqual(789866.3337287647, x[1], places=6)
+            self.assertTrue(numpy.all(numpy.isfinite(y)), 'The latitudes must be clamped at the poles!')
+            self.assertAlmostEqual(x[3], y[3], places=6)
+
+            wgs84_longitudes, wgs84_latitudes = geospatial_engine.project_coordinates(x, y, 3857, 4326)
+            numpy.testing.assert_allclose(longitudes, wgs84_longitudes)
+            numpy.testing.assert_allclose(latitudes[:2], wgs84_latitudes[:2])
+
+    def test_binning_grid(self):
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            grid = geospatial_engine.create_spatial_grid(10e6)
+            points = geospatial_engine.create_points([51.83864, 50.73438], [12.24555, 7.09549])
+            mercator_points = geospatial_engine.project(points, 4326, 3857)
+            aggregation = geospatial_engine.aggregate(grid, mercator_points, grid.wkid())
+            bins = aggregation.bins()
+            self.assertEqual(1, len(bins), 'One bin was expected!')
+            self.assertEqual(2, bins[0]['hitCount'], 'Hit count of 2 was expected!')
+
+
+
+class TestChunkedProjection(unittest.TestCase):
+
+    def test_project_in_chunks(self):
+        lock = threading.Lock()
+        calls = []
+
+        def project_chunk(geometries, in_sr, out_sr, gis=None):
+            with lock:
+                calls.append(len(geometries))
+                if 1 == len(calls):
+                    raise ConnectionError('Service temporarily not available!')
+                if 2 == len(calls):
+                    raise Exception('Service unavailable\n(Error Code: 503)')
+
+            return [geospatial.Point({'x': point.x + 1.0, 'y': point.y}) for point in geometries]
+
+        geospatial_engine = geospatial.geospatial_engine_factory.create_cloud_engine(chunk_size=100, max_workers=4, backoff_factor=0.0)
+        points = geospatial_engine.create_points(list(range(0, 1050)), list(range(0, 1050)))
+        with mock.patch.object(geospatial, 'GIS'), mock.patch.object(geospatial, 'ago_project', side_effect=project_chunk):
+            projected_points = geospatial_engine.project(points, 4326, 25832)
+
+        self.assertEqual(13, len(calls), 'Eleven chunks and two retries were expected!')
+        self.assertEqual(len(points), len(projected_points), 'The same number of points must be returned!')
+        self.assertListEqual([point.x + 1.0 for point in points], [point.x for point in projected_points], 'The input order must be preserved!')
+
+
+    def test_permanent_errors_are_not_retried(self):
+        geospatial_engine = geospatial.geospatial_engine_factory.create_cloud_engine(backoff_factor=10.0)
+        points = geospatial_engine.create_points([51.0], [12.0])
+        invalid_reference = Exception('Invalid spatial reference\n(Error Code: 400)')
+        with mock.patch.object(geospatial, 'GIS'), mock.patch.object(geospatial, 'ago_project', side_effect=invalid_reference) as project:
+            with self.assertRaises(Exception):
+                geospatial_engine.project(points, 4326, 123456)
+            project.assert_called_once()
+
+
+
+class TestLazyGrid(unittest.TestCase):
+
+    def test_lazy_cells(self):
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            grid = geospatial_engine.create_spatial_grid(1e6)
+            lazy_grid = geospatial_engine.create_spatial_grid(1e6, lazy=True)
+            self.assertTrue(lazy_grid.is_lazy(), 'The grid must be lazy!')
+
+            cells = grid.cells()
+            lazy_cells = lazy_grid.cells()
+            self.assertEqual(len(cells), len(lazy_cells), 'The number of cells must match!')
+            for (cell, lazy_cell) in zip(cells, lazy_cells):
+                self.assertListEqual(cell.as_ring(), lazy_cell.as_ring(), 'The lazy cell must match the cell!')
+
+            self.assertListEqual(cells[-1].as_ring(), lazy_cells[-1].as_ring(), 'The last cell must match!')
+            self.assertListEqual(grid.cells_as_rings()[7], lazy_grid.cells_as_rings()[7], 'The rings must match!')
+
+            cell = lazy_grid.intersect(1.0, 1.0)
+            self.assertTrue(cell.intersects(1.0, 1.0), 'The intersecting cell must contain the location!')
+
+    def test_lazy_binning(self):
+        with geospatial.geospatial_engine_factory.create_local_engine() as geospatial_engine:
+            grid = geospatial_engine.create_spatial_grid(1e4, lazy=True)
+            self.assertEqual(4008 * 4008, len(grid.cells()), 'The grid must have 4008x4008 cells!')
+            x, y = geospatial_engine.project_coordinates([12.24555, 7.09549], [51.83864, 50.73438], 4326, 3857)
+            aggregation = geospatial_engine.aggregate_coordinates(grid, x, y, grid.wkid())
+            self.assertEqual(2, len(aggregation.bins()), 'Two bins were expected!')
+
+
+
 if __name__ == '__main__':
     unittest.main()
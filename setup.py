@@ -34,7 +34,7 @@ setuptools.setup(
     long_description_content_type='text/markdown',
     url='https://github.com/gisfromscratch/geoint-py',
     packages=['geoint'],
-    install_requires=['arcgis>=1.8', 'pandas>=1.5', 'georapid>=0.2'],
+    install_requires=['arcgis>=1.8', 'numpy>=1.20', 'pandas>=1.5', 'georapid>=0.2'],
     classifiers=[
         'Programming Language :: Python :: 3',
         'License :: OSI Approved :: GNU Lesser General Public License v3 (LGPLv3)',